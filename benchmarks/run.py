@@ -0,0 +1,214 @@
+"""
+Benchmarks parse_replay on a synthetic corpus and writes the results as JSON.
+
+    python -m benchmarks.run --replays 20 --events 20000 --output results.json
+    python -m benchmarks.run --baseline results.json
+
+For every build, parse_replay is timed end to end (latency and throughput) and each
+parsing stage is timed on its own. --baseline prints how a run compares to an
+earlier results file.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from nicer_replay_parsing import ReplayProfile, parse_replay
+from nicer_replay_parsing.cache import LIBRARY_VERSION
+from nicer_replay_parsing.util import get_latest_build
+
+from .synthetic import generate_replay
+
+STAGES = (
+    "archive_open",
+    "header",
+    "details",
+    "battlelobby",
+    "initdata",
+    "tracker",
+    "model_build",
+)
+
+
+def time_stages(source, mode="full", prefetch=False) -> dict[str, float]:
+    """Parses a replay with parse_replay(mode=mode) and returns its stage timings."""
+    profile = ReplayProfile()
+    parse_replay(source, mode=mode, profile=profile, prefetch=prefetch)
+    return profile.stages
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p95_ms": samples[min(len(samples) - 1, len(samples) * 95 // 100)] * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+def run_build(build, replays, events, repeat, mode, prefetch=False):
+    corpus = [generate_replay(events, seed, build=build) for seed in range(replays)]
+    size = sum(len(replay) for replay in corpus)
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for replay in corpus:
+            replay_start = time.perf_counter()
+            parse_replay(replay, mode=mode, prefetch=prefetch)
+            latencies.append(time.perf_counter() - replay_start)
+    elapsed = time.perf_counter() - start
+
+    stages = {stage: [] for stage in STAGES}
+    for _ in range(repeat):
+        for replay in corpus:
+            for stage, seconds in time_stages(replay, mode, prefetch).items():
+                stages[stage].append(seconds)
+
+    return {
+        "replays": replays,
+        "events": events,
+        "bytes": size,
+        "parse_replay": {
+            "mode": mode,
+            "prefetch": prefetch,
+            "replays_per_s": len(latencies) / elapsed,
+            "mb_per_s": size * repeat / elapsed / 1e6,
+            "latency": _summary(latencies),
+        },
+        # fast mode has no tracker stage
+        "stages": {
+            stage: _summary(samples) for stage, samples in stages.items() if samples
+        },
+        **_corpus_profile(corpus, mode),
+    }
+
+
+def time_prefetch(build, replays, events, repeat, mode) -> dict:
+    """
+    Times parse_replay on the same corpus with prefetch off and on, alternating
+    replay by replay so both see the same machine load.
+    """
+    corpus = [generate_replay(events, seed, build=build) for seed in range(replays)]
+    latencies = {False: [], True: []}
+    for _ in range(repeat):
+        for replay in corpus:
+            for prefetch in (False, True):
+                start = time.perf_counter()
+                parse_replay(replay, mode=mode, prefetch=prefetch)
+                latencies[prefetch].append(time.perf_counter() - start)
+    off = _summary(latencies[False])
+    on = _summary(latencies[True])
+    return {
+        "mode": mode,
+        "off": off,
+        "on": on,
+        "speedup": off["mean_ms"] / on["mean_ms"],
+    }
+
+
+def _corpus_profile(corpus, mode):
+    # Bytes read and decompressed per archive file and tracker event counts, summed
+    # over the corpus
+    profile = ReplayProfile()
+    for replay in corpus:
+        parse_replay(replay, mode=mode, profile=profile)
+    return {"files": profile.files, "tracker_events": profile.events}
+
+
+def compare(results, baseline):
+    for build, result in results["builds"].items():
+        if build not in baseline["builds"]:
+            continue
+        old = baseline["builds"][build]
+        print(f"build {build}")
+        rows = [
+            (
+                "parse_replay",
+                old["parse_replay"]["latency"],
+                result["parse_replay"]["latency"],
+            )
+        ]
+        rows += [
+            (stage, old["stages"][stage], result["stages"][stage])
+            for stage in STAGES
+            if stage in old["stages"] and stage in result["stages"]
+        ]
+        for name, before, after in rows:
+            before, after = before["mean_ms"], after["mean_ms"]
+            print(
+                f"  {name:<14} {before:9.3f} ms -> {after:9.3f} ms"
+                f"  ({before / after:.2f}x)"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--replays", type=int, default=20)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--mode", default="full", choices=("full", "fast", "draft"))
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="time parse_replay with prefetch=True (parallel decompression)",
+    )
+    parser.add_argument(
+        "--compare-prefetch",
+        action="store_true",
+        help="also time parse_replay with prefetch off and on, replay by replay",
+    )
+    parser.add_argument(
+        "--builds",
+        type=int,
+        nargs="+",
+        help="heroprotocol base builds to generate replays for (default: the latest)",
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    builds = args.builds or [get_latest_build()]
+    results = {
+        "library_version": LIBRARY_VERSION,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "builds": {},
+    }
+    for build in builds:
+        result = run_build(
+            build, args.replays, args.events, args.repeat, args.mode, args.prefetch
+        )
+        results["builds"][str(build)] = result
+        print(
+            f"build {build}: {result['parse_replay']['replays_per_s']:.1f} replays/s,"
+            f" {result['parse_replay']['latency']['mean_ms']:.2f} ms mean latency"
+        )
+        if args.compare_prefetch:
+            comparison = time_prefetch(
+                build, args.replays, args.events, args.repeat, args.mode
+            )
+            result["prefetch_comparison"] = comparison
+            print(
+                f"  prefetch: {comparison['off']['mean_ms']:.2f} ms ->"
+                f" {comparison['on']['mean_ms']:.2f} ms"
+                f" ({comparison['speedup']:.2f}x, {os.cpu_count()} CPUs)"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
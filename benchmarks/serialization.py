@@ -0,0 +1,92 @@
+"""
+Benchmarks serializing parsed replays: pickle, Replay.to_bytes() and
+Replay.to_dict() through json.
+
+    python -m benchmarks.serialization --replays 20 --repeat 500 --output results.json
+
+Every format is timed encoding and decoding the same parsed replays; the results are
+throughputs (replays/s) and the mean encoded size.
+"""
+
+import argparse
+import json
+import pickle
+import platform
+import sys
+import time
+
+from nicer_replay_parsing import Replay, parse_replay
+from nicer_replay_parsing.cache import LIBRARY_VERSION
+
+from .synthetic import generate_replay
+
+FORMATS = {
+    "pickle": (
+        lambda replay: pickle.dumps(replay, pickle.HIGHEST_PROTOCOL),
+        pickle.loads,
+    ),
+    "to_bytes": (Replay.to_bytes, Replay.from_bytes),
+    "json": (
+        lambda replay: json.dumps(replay.to_dict()),
+        lambda data: Replay.from_dict(json.loads(data)),
+    ),
+}
+
+
+def run_format(name, replays, repeat):
+    encode, decode = FORMATS[name]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encoded = [encode(replay) for replay in replays]
+    encode_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeat):
+        decoded = [decode(data) for data in encoded]
+    decode_seconds = time.perf_counter() - start
+
+    for replay, copy in zip(replays, decoded):
+        if copy.to_dict() != replay.to_dict():
+            raise Exception(f"{name} doesn't round-trip replay {replay.id}")
+    count = len(replays) * repeat
+    return {
+        "encode_replays_per_s": count / encode_seconds,
+        "decode_replays_per_s": count / decode_seconds,
+        "bytes_per_replay": sum(len(data) for data in encoded) / len(encoded),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--replays", type=int, default=20)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    replays = [
+        parse_replay(generate_replay(args.events, seed)) for seed in range(args.replays)
+    ]
+    results = {
+        "library_version": LIBRARY_VERSION,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "replays": args.replays,
+        "formats": {},
+    }
+    for name in FORMATS:
+        result = run_format(name, replays, args.repeat)
+        results["formats"][name] = result
+        print(
+            f"{name:<9} encode {result['encode_replays_per_s']:10.0f} replays/s,"
+            f" decode {result['decode_replays_per_s']:10.0f} replays/s,"
+            f" {result['bytes_per_replay']:6.0f} bytes"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,678 @@
+"""
+Generates synthetic but valid .StormReplay files, since real replays can't be
+committed. The header, details, initData and tracker events are encoded with the
+typeinfos of the chosen heroprotocol build, and packed into an MPQ archive the same
+way the game does (zlib compressed sectors, encrypted hash and block tables).
+"""
+
+import os
+import random
+import struct
+import zlib
+
+from nicer_replay_parsing.archive import (
+    _ENCRYPTION_TABLE,
+    _HASH_A,
+    _HASH_B,
+    _HASH_TABLE,
+    _HASH_TABLE_OFFSET,
+    _MPQ_FILE_COMPRESS,
+    _MPQ_FILE_EXISTS,
+    _MPQ_FILE_SINGLE_UNIT,
+    _hash,
+)
+from nicer_replay_parsing.model import Battleground, Gamemode, Hero
+from nicer_replay_parsing.util import (
+    _INTERNAL_HERO_DICT,
+    _LOCALIZED_BATTLEGROUND_DICT,
+    _LOCALIZED_HERO_DICT,
+    get_latest_build,
+    import_heroprotocol,
+)
+
+_SECTOR_SIZE_SHIFT = 3
+
+_AMM_IDS = {
+    Gamemode.QUICK_MATCH: 50001,
+    Gamemode.VERSUS_AI: 50021,
+    Gamemode.BRAWL: 50031,
+    Gamemode.UNRANKED_DRAFT: 50051,
+    Gamemode.HERO_LEAGUE: 50061,
+    Gamemode.STORM_LEAGUE: 50091,
+    Gamemode.ARAM: 50101,
+}
+
+
+def _encrypt(data, key):
+    # Inverse of archive._decrypt
+    seed1 = key
+    seed2 = 0xEEEEEEEE
+    result = bytearray()
+    for (value,) in struct.iter_unpack("<I", data):
+        seed2 = (seed2 + _ENCRYPTION_TABLE[0x400 + (seed1 & 0xFF)]) & 0xFFFFFFFF
+        result += struct.pack("<I", (value ^ (seed1 + seed2)) & 0xFFFFFFFF)
+        seed1 = ((((~seed1) << 0x15) + 0x11111111) | (seed1 >> 0x0B)) & 0xFFFFFFFF
+        seed2 = (value + seed2 + (seed2 << 5) + 3) & 0xFFFFFFFF
+    return bytes(result)
+
+
+class _VersionedEncoder:
+    """Inverse of heroprotocol's VersionedDecoder."""
+
+    def __init__(self, typeinfos):
+        self._typeinfos = typeinfos
+        self._data = bytearray()
+
+    def getvalue(self):
+        return bytes(self._data)
+
+    def instance(self, typeid, value):
+        typeinfo = self._typeinfos[typeid]
+        getattr(self, typeinfo[0])(value, *typeinfo[1])
+
+    def _vint(self, value):
+        negative = value < 0
+        value = -value if negative else value
+        b = ((value & 0x3F) << 1) | negative
+        value >>= 6
+        while value:
+            self._data.append(b | 0x80)
+            b = value & 0x7F
+            value >>= 7
+        self._data.append(b)
+
+    def _array(self, value, bounds, typeid):
+        self._data.append(0)
+        self._vint(len(value))
+        for item in value:
+            self.instance(typeid, item)
+
+    def _bitarray(self, value, bounds):
+        self._data.append(1)
+        self._vint(value[0])
+        self._data += value[1]
+
+    def _blob(self, value, bounds):
+        self._data.append(2)
+        self._vint(len(value))
+        self._data += value
+
+    def _bool(self, value):
+        self._data.append(6)
+        self._data.append(1 if value else 0)
+
+    def _choice(self, value, bounds, fields):
+        self._data.append(3)
+        ((name, item),) = value.items()
+        tag, field = next((t, f) for t, f in fields.items() if f[0] == name)
+        self._vint(tag)
+        self.instance(field[1], item)
+
+    def _fourcc(self, value):
+        self._data.append(7)
+        self._data += value
+
+    def _int(self, value, bounds):
+        self._data.append(9)
+        self._vint(value)
+
+    def _null(self, value):
+        pass
+
+    def _optional(self, value, typeid):
+        self._data.append(4)
+        self._data.append(0 if value is None else 1)
+        if value is not None:
+            self.instance(typeid, value)
+
+    def _struct(self, value, fields):
+        self._data.append(5)
+        present = [f for f in fields if f[0] == "__parent" or f[0] in value]
+        self._vint(len(present))
+        for name, typeid, tag in present:
+            self._vint(tag)
+            self.instance(typeid, value if name == "__parent" else value[name])
+
+
+class _BitPackedEncoder:
+    """Inverse of heroprotocol's BitPackedDecoder."""
+
+    def __init__(self, typeinfos):
+        self._typeinfos = typeinfos
+        self._data = bytearray()
+        self._next = 0
+        self._nextbits = 0
+
+    def getvalue(self):
+        self._byte_align()
+        return bytes(self._data)
+
+    def _byte_align(self):
+        if self._nextbits:
+            self._data.append(self._next)
+            self._next = 0
+            self._nextbits = 0
+
+    def _write_bits(self, value, bits):
+        while bits:
+            copybits = min(bits, 8 - self._nextbits)
+            chunk = (value >> (bits - copybits)) & ((1 << copybits) - 1)
+            self._next |= chunk << self._nextbits
+            self._nextbits += copybits
+            bits -= copybits
+            if self._nextbits == 8:
+                self._byte_align()
+
+    def instance(self, typeid, value):
+        typeinfo = self._typeinfos[typeid]
+        getattr(self, typeinfo[0])(value, *typeinfo[1])
+
+    def default(self, typeid):
+        name, args = self._typeinfos[typeid]
+        if name == "_array":
+            return []
+        if name == "_bitarray":
+            return (0, 0)
+        if name == "_blob":
+            return b""
+        if name == "_bool":
+            return False
+        if name == "_choice":
+            field = args[1][min(args[1])]
+            return {field[0]: self.default(field[1])}
+        if name == "_fourcc":
+            return b"\x00\x00\x00\x00"
+        if name == "_int":
+            return args[0][0]
+        if name == "_struct":
+            value = {}
+            for field in args[0]:
+                if field[0] == "__parent":
+                    value.update(self.default(field[1]))
+                else:
+                    value[field[0]] = self.default(field[1])
+            return value
+        return None
+
+    def _array(self, value, bounds, typeid):
+        self._int(len(value), bounds)
+        for item in value:
+            self.instance(typeid, item)
+
+    def _bitarray(self, value, bounds):
+        self._int(value[0], bounds)
+        self._write_bits(value[1], value[0])
+
+    def _blob(self, value, bounds):
+        self._int(len(value), bounds)
+        self._byte_align()
+        self._data += value
+
+    def _bool(self, value):
+        self._int(1 if value else 0, (0, 1))
+
+    def _choice(self, value, bounds, fields):
+        ((name, item),) = value.items()
+        tag, field = next((t, f) for t, f in fields.items() if f[0] == name)
+        self._int(tag, bounds)
+        self.instance(field[1], item)
+
+    def _fourcc(self, value):
+        self._write_bits(struct.unpack("!I", value)[0], 32)
+
+    def _int(self, value, bounds):
+        self._write_bits(value - bounds[0], bounds[1])
+
+    def _null(self, value):
+        pass
+
+    def _optional(self, value, typeid):
+        self._bool(value is not None)
+        if value is not None:
+            self.instance(typeid, value)
+
+    def _struct(self, value, fields):
+        for name, typeid, _ in fields:
+            self.instance(typeid, value if name == "__parent" else value[name])
+
+
+def _versioned(protocol, typeid, value):
+    encoder = _VersionedEncoder(protocol.typeinfos)
+    encoder.instance(typeid, value)
+    return encoder.getvalue()
+
+
+def _event_stream(protocol, events):
+    encoder = _VersionedEncoder(protocol.typeinfos)
+    ids = {
+        name: (eventid, typeid)
+        for eventid, (typeid, name) in protocol.tracker_event_types.items()
+    }
+    gameloop = 0
+    for loop, name, event in events:
+        encoder.instance(protocol.svaruint32_typeid, {"m_uint32": loop - gameloop})
+        gameloop = loop
+        eventid, typeid = ids[name]
+        encoder.instance(protocol.tracker_eventid_typeid, eventid)
+        encoder.instance(typeid, event)
+    return encoder.getvalue()
+
+
+def _mpq(user_data, files, compress=True, sectors=False):
+    """Builds an MPQ archive with a user data header like HotS replays."""
+    files = dict(files)
+    files["(listfile)"] = "\r\n".join(files).encode()
+    user_data_size = 0x200
+    mpq_offset = 0x400
+    body = bytearray()
+    blocks = []
+    for name, data in files.items():
+        flags = _MPQ_FILE_EXISTS
+        offset = 44 + len(body)
+        if sectors:
+            sector_size = 512 << _SECTOR_SIZE_SHIFT
+            count = len(data) // sector_size + 1
+            chunks = []
+            for i in range(count):
+                chunk = data[i * sector_size : (i + 1) * sector_size]
+                if compress:
+                    packed = b"\x02" + zlib.compress(chunk)
+                    if len(packed) < len(chunk):
+                        chunk = packed
+                chunks.append(chunk)
+            positions = [4 * (count + 1)]
+            for chunk in chunks:
+                positions.append(positions[-1] + len(chunk))
+            stored = struct.pack("<%dI" % (count + 1), *positions) + b"".join(chunks)
+            if compress:
+                flags |= _MPQ_FILE_COMPRESS
+        else:
+            flags |= _MPQ_FILE_SINGLE_UNIT
+            stored = data
+            if compress:
+                packed = b"\x02" + zlib.compress(data)
+                if len(packed) < len(data):
+                    stored = packed
+                flags |= _MPQ_FILE_COMPRESS
+        body += stored
+        blocks.append((offset, len(stored), len(data), flags))
+
+    hash_size = 16
+    while hash_size < len(files) * 2:
+        hash_size *= 2
+    hash_table = [(0xFFFFFFFF, 0xFFFFFFFF, 0xFFFF, 0xFFFF, 0xFFFFFFFF)] * hash_size
+    for index, name in enumerate(files):
+        slot = _hash(name, _HASH_TABLE_OFFSET) & (hash_size - 1)
+        while hash_table[slot][4] != 0xFFFFFFFF:
+            slot = (slot + 1) & (hash_size - 1)
+        hash_table[slot] = (_hash(name, _HASH_A), _hash(name, _HASH_B), 0, 0, index)
+
+    hash_offset = 44 + len(body)
+    hash_data = b"".join(struct.pack("<2I2HI", *entry) for entry in hash_table)
+    block_offset = hash_offset + len(hash_data)
+    block_data = b"".join(struct.pack("<4I", *entry) for entry in blocks)
+    hash_data = _encrypt(hash_data, _hash("(hash table)", _HASH_TABLE))
+    block_data = _encrypt(block_data, _hash("(block table)", _HASH_TABLE))
+    archive_size = block_offset + len(block_data)
+    header = struct.pack(
+        "<4s2I2H4I",
+        b"MPQ\x1a",
+        44,
+        archive_size,
+        1,
+        _SECTOR_SIZE_SHIFT,
+        hash_offset,
+        block_offset,
+        hash_size,
+        len(blocks),
+    ) + struct.pack("q2h", 0, 0, 0)
+
+    user_header = struct.pack(
+        "<4s3I", b"MPQ\x1b", user_data_size, mpq_offset, len(user_data)
+    )
+    prefix = (user_header + user_data).ljust(mpq_offset, b"\x00")
+    return prefix + header + bytes(body) + hash_data + block_data
+
+
+def _first_key(mapping, value):
+    return next(k for k, v in mapping.items() if v == value)
+
+
+def generate_replay(
+    events=20000,
+    seed=0,
+    gamemode=Gamemode.STORM_LEAGUE,
+    battleground=Battleground.CURSED_HOLLOW,
+    build=None,
+    compress=True,
+    sectors=True,
+) -> bytes:
+    """
+    Returns a synthetic replay with roughly `events` tracker events, encoded for the
+    heroprotocol `build` (the latest one by default). The same seed always gives the
+    same replay.
+    """
+    build = build or get_latest_build()
+    protocol = import_heroprotocol(build)
+    rng = random.Random(seed)
+    heroes = rng.sample([h for h in Hero if h != Hero.UNKNOWN], 16)
+    picks, bans = heroes[:10], heroes[10:]
+    toons = [rng.randrange(1, 10**7) for _ in range(10)]
+    names = [f"Player{i}{seed}".encode() for i in range(10)]
+    winner = rng.randrange(2)
+    game_loops = 610 + 16 * rng.randrange(600, 1800)
+
+    players = []
+    for i in range(10):
+        team = i // 5
+        players.append(
+            {
+                "m_name": names[i],
+                "m_toon": {
+                    "m_region": 2,
+                    "m_programId": b"Hero",
+                    "m_realm": 1,
+                    "m_name": b"",
+                    "m_id": toons[i],
+                },
+                "m_race": b"",
+                "m_control": 2,
+                "m_teamId": team,
+                "m_observe": 0,
+                "m_result": 1 if team == winner else 2,
+                "m_workingSetSlotId": i,
+                "m_hero": _first_key(_LOCALIZED_HERO_DICT, picks[i]).encode(),
+            }
+        )
+    details = {
+        "m_playerList": players,
+        "m_title": _first_key(_LOCALIZED_BATTLEGROUND_DICT, battleground).encode(),
+        "m_isBlizzardMap": True,
+        "m_timeUTC": 133000000000000000 + rng.randrange(10**15),
+        "m_timeLocalOffset": 0,
+    }
+
+    bitpacked = _BitPackedEncoder(protocol.typeinfos)
+    initdata = bitpacked.default(protocol.replay_initdata_typeid)
+    description = initdata["m_syncLobbyState"]["m_gameDescription"]
+    description["m_randomValue"] = rng.randrange(2**32)
+    description["m_gameOptions"]["m_amm"] = True
+    description["m_gameOptions"]["m_ammId"] = _AMM_IDS.get(gamemode)
+    bitpacked.instance(protocol.replay_initdata_typeid, initdata)
+
+    header = {
+        "m_signature": b"Heroes of the Storm replay\x1b11",
+        "m_version": {
+            "m_flags": 1,
+            "m_major": 2,
+            "m_minor": 55,
+            "m_revision": 4,
+            "m_build": build,
+            "m_baseBuild": build,
+        },
+        "m_type": 2,
+        "m_elapsedGameLoops": game_loops,
+        "m_useScaledTime": False,
+        "m_dataBuildNum": build,
+    }
+
+    stream = []
+    stat = "NNet.Replay.Tracker.SStatGameEvent"
+    for i in range(10):
+        stream.append(
+            (
+                0,
+                stat,
+                {
+                    "m_eventName": b"PlayerInit",
+                    "m_stringData": [
+                        {"m_key": b"Controller", "m_value": b"User"},
+                        {
+                            "m_key": b"ToonHandle",
+                            "m_value": f"2-Hero-1-{toons[i]}".encode(),
+                        },
+                    ],
+                    "m_intData": [
+                        {"m_key": b"PlayerID", "m_value": i + 1},
+                        {"m_key": b"Team", "m_value": i // 5 + 1},
+                    ],
+                    "m_fixedData": None,
+                },
+            )
+        )
+    order = [
+        ("ban", 0),
+        ("ban", 1),
+        ("ban", 0),
+        ("ban", 1),
+        ("pick", 0),
+        ("pick", 1),
+        ("pick", 1),
+        ("pick", 0),
+        ("pick", 0),
+        ("ban", 1),
+        ("ban", 0),
+        ("ban", 1),
+        ("ban", 0),
+        ("pick", 1),
+        ("pick", 1),
+        ("pick", 0),
+        ("pick", 0),
+        ("pick", 1),
+        ("pick", 0),
+        ("pick", 1),
+    ]
+    ban_iter = iter(bans)
+    pick_iters = [iter(picks[:5]), iter(picks[5:])]
+    draft_actions = 0
+    for kind, team in order:
+        if kind == "ban":
+            hero = next(ban_iter, None)
+            if hero is None or draft_actions >= 16:
+                continue
+            stream.append(
+                (
+                    0,
+                    "NNet.Replay.Tracker.SHeroBannedEvent",
+                    {
+                        "m_hero": _first_key(_INTERNAL_HERO_DICT, hero).encode(),
+                        "m_controllingTeam": team + 1,
+                    },
+                )
+            )
+        else:
+            hero = next(pick_iters[team], None)
+            if hero is None:
+                continue
+            stream.append(
+                (
+                    0,
+                    "NNet.Replay.Tracker.SHeroPickedEvent",
+                    {
+                        "m_hero": _first_key(_INTERNAL_HERO_DICT, hero).encode(),
+                        "m_controllingPlayer": picks.index(hero) + 1,
+                    },
+                )
+            )
+        draft_actions += 1
+
+    stream.append(
+        (
+            1,
+            stat,
+            {
+                "m_eventName": b"GameStart",
+                "m_stringData": None,
+                "m_intData": None,
+                "m_fixedData": [{"m_key": b"MapSizeX", "m_value": 1 << 20}],
+            },
+        )
+    )
+
+    for core in range(2):
+        stream.append(
+            (
+                1,
+                "NNet.Replay.Tracker.SUnitBornEvent",
+                {
+                    "m_unitTagIndex": 100 + core,
+                    "m_unitTagRecycle": 1,
+                    "m_unitTypeName": b"KingsCore",
+                    "m_controlPlayerId": 11 + core,
+                    "m_upkeepPlayerId": 11 + core,
+                    "m_x": 10 + 200 * core,
+                    "m_y": 100,
+                },
+            )
+        )
+
+    filler = max(events - len(stream) - 11, 0)
+    for i in range(filler):
+        loop = 2 + (game_loops - 4) * i // max(filler, 1)
+        kind = rng.random()
+        if kind < 0.45:
+            stream.append(
+                (
+                    loop,
+                    "NNet.Replay.Tracker.SUnitBornEvent",
+                    {
+                        "m_unitTagIndex": 200 + i,
+                        "m_unitTagRecycle": 1,
+                        "m_unitTypeName": b"WizardMinion",
+                        "m_controlPlayerId": 11 + i % 2,
+                        "m_upkeepPlayerId": 11 + i % 2,
+                        "m_x": rng.randrange(256),
+                        "m_y": rng.randrange(256),
+                    },
+                )
+            )
+        elif kind < 0.8:
+            stream.append(
+                (
+                    loop,
+                    "NNet.Replay.Tracker.SUnitDiedEvent",
+                    {
+                        "m_unitTagIndex": 200 + i,
+                        "m_unitTagRecycle": 1,
+                        "m_killerPlayerId": rng.randrange(1, 11),
+                        "m_x": rng.randrange(256),
+                        "m_y": rng.randrange(256),
+                        "m_killerUnitTagIndex": None,
+                        "m_killerUnitTagRecycle": None,
+                    },
+                )
+            )
+        elif kind < 0.9:
+            stream.append(
+                (
+                    loop,
+                    "NNet.Replay.Tracker.SUnitPositionsEvent",
+                    {
+                        "m_firstUnitIndex": 200,
+                        "m_items": [rng.randrange(-1000, 1000) for _ in range(30)],
+                    },
+                )
+            )
+        else:
+            stream.append(
+                (
+                    loop,
+                    stat,
+                    {
+                        "m_eventName": b"PeriodicXPBreakdown",
+                        "m_stringData": None,
+                        "m_intData": [
+                            {"m_key": b"Team", "m_value": i % 2 + 1},
+                            {"m_key": b"TeamLevel", "m_value": rng.randrange(1, 30)},
+                        ],
+                        "m_fixedData": [
+                            {"m_key": b"MinionXP", "m_value": rng.randrange(10**6)},
+                            {"m_key": b"HeroXP", "m_value": rng.randrange(10**6)},
+                        ],
+                    },
+                )
+            )
+
+    end = game_loops - 1
+    stream.append(
+        (
+            end,
+            "NNet.Replay.Tracker.SUnitDiedEvent",
+            {
+                "m_unitTagIndex": 100 + (1 - winner),
+                "m_unitTagRecycle": 1,
+                "m_killerPlayerId": None,
+                "m_x": 0,
+                "m_y": 0,
+                "m_killerUnitTagIndex": None,
+                "m_killerUnitTagRecycle": None,
+            },
+        )
+    )
+    for i in range(10):
+        stream.append(
+            (
+                end,
+                stat,
+                {
+                    "m_eventName": b"EndOfGameTalentChoices",
+                    "m_stringData": [
+                        {"m_key": b"Hero", "m_value": b"Hero"},
+                        {
+                            "m_key": b"Win/Loss",
+                            "m_value": b"Win" if i // 5 == winner else b"Loss",
+                        },
+                    ],
+                    "m_intData": [
+                        {"m_key": b"PlayerID", "m_value": i + 1},
+                        {"m_key": b"Level", "m_value": rng.randrange(10, 30)},
+                    ],
+                    "m_fixedData": None,
+                },
+            )
+        )
+
+    lobby = bytearray(rng.randbytes(2048))
+    for i, name in enumerate(names):
+        tag = b"%s#%d" % (name, 1000 + toons[i] % 9000)
+        lobby += bytes([len(tag) * 2]) + tag + rng.randbytes(64)
+
+    files = {
+        "replay.server.battlelobby": bytes(lobby),
+        "replay.details": _versioned(protocol, protocol.game_details_typeid, details),
+        "replay.initData": bitpacked.getvalue(),
+        "replay.tracker.events": _event_stream(protocol, stream),
+        "replay.game.events": b"",
+        "replay.message.events": b"",
+        "replay.attributes.events": b"",
+    }
+    user_data = _versioned(protocol, protocol.replay_header_typeid, header)
+    return _mpq(user_data, files, compress=compress, sectors=sectors)
+
+
+def write_corpus(directory, count, events=20000, builds=None, seed=0):
+    """
+    Writes `count` synthetic replays to `directory`, cycling through `builds`, and
+    returns their paths.
+    """
+    builds = builds or [get_latest_build()]
+    gamemodes = list(_AMM_IDS)
+    battlegrounds = [
+        b for b in dict.fromkeys(_LOCALIZED_BATTLEGROUND_DICT.values()) if b.lanes
+    ]
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"synthetic-{seed + i}.StormReplay")
+        with open(path, "wb") as f:
+            f.write(
+                generate_replay(
+                    events,
+                    seed + i,
+                    gamemodes[i % len(gamemodes)],
+                    battlegrounds[i % len(battlegrounds)],
+                    builds[i % len(builds)],
+                )
+            )
+        paths.append(path)
+    return paths
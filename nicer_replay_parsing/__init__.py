@@ -1,8 +1,48 @@
+import importlib
 import sys
 
 from . import imp
 
 sys.modules["imp"] = imp
 import heroprotocol
-from .parse_replay import parse_replay, print_replay_contents
+from .parse_replay import (
+    iter_replays,
+    parse_replay,
+    parse_replays,
+    print_replay_contents,
+    probe_replay,
+)
 from .model import *
+from .filters import ReplayFilter
+from .profiling import ReplayProfile
+from .replay_ids import ReplayIdIndex
+
+# Imported on first use, so that importing the package (e.g. in a short-lived script
+# talking to a server) doesn't import numpy, sqlite3 or socketserver
+_LAZY = {
+    "ReplayCache": ".cache",
+    "ReplayDatabase": ".database",
+    "ReplayClient": ".server",
+    "serve": ".server",
+    "HeroMatchups": ".stats",
+    "HeroStats": ".stats",
+    "hero_matchups": ".stats",
+    "hero_stats": ".stats",
+    "ReplayStore": ".store",
+    "ReplayTable": ".table",
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    try:
+        module = importlib.import_module(_LAZY[name], __name__)
+    except ModuleNotFoundError as e:
+        if e.name != "numpy":
+            raise
+        raise AttributeError(
+            f"{name} needs numpy (pip install nicer-replay-parsing[table])"
+        ) from e
+    value = globals()[name] = getattr(module, name)
+    return value
@@ -0,0 +1,45 @@
+import argparse
+
+from .server import ReplayClient, serve
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="nicer-replay-parsing")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser(
+        "serve", help="parse replays for clients on a Unix domain socket"
+    )
+    serve_parser.add_argument("--socket", help="path of the socket")
+    serve_parser.add_argument(
+        "--workers",
+        type=int,
+        help="worker processes (default: one per core, 0: parse in the server)",
+    )
+    serve_parser.add_argument("--cache", help="ReplayCache directory")
+
+    parse_parser = commands.add_parser(
+        "parse", help="parse replays on a running server and print them"
+    )
+    parse_parser.add_argument("replays", nargs="+")
+    parse_parser.add_argument("--socket", help="path of the socket")
+    parse_parser.add_argument(
+        "--mode", default="full", choices=("full", "fast", "draft")
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        # Only the server needs sqlite3
+        from .cache import ReplayCache
+
+        serve(
+            args.socket, args.workers, ReplayCache(args.cache) if args.cache else None
+        )
+    else:
+        with ReplayClient(args.socket) as client:
+            for path in args.replays:
+                print(client.parse(path, args.mode))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+from collections import namedtuple
+from concurrent.futures import wait
+from functools import lru_cache
+import bz2
+import mmap
+import os
+import struct
+import zlib
+
+_MPQ_FILE_COMPRESS = 0x00000200
+_MPQ_FILE_ENCRYPTED = 0x00010000
+_MPQ_FILE_SINGLE_UNIT = 0x01000000
+_MPQ_FILE_EXISTS = 0x80000000
+
+# Sectors per prefetch task. Sectors are usually 4 KiB, so a task inflates up to
+# 256 KiB: enough to outweigh handing it to a thread.
+_PREFETCH_BATCH = 64
+
+HashTableEntry = namedtuple(
+    "HashTableEntry", "hash_a hash_b locale platform block_table_index"
+)
+BlockTableEntry = namedtuple("BlockTableEntry", "offset archived_size size flags")
+
+
+def open_archive(source) -> "MappedArchive":
+    """
+    Opens a replay's MPQ archive from a path, a bytes-like object (bytes, bytearray,
+    memoryview) or a seekable binary file object.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return MappedArchive(_map(f))
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return MappedArchive(source)
+    try:
+        return MappedArchive(_map(source))
+    except (AttributeError, OSError, ValueError):
+        # Not backed by a file (e.g. io.BytesIO)
+        source.seek(0)
+        return MappedArchive(source.read())
+
+
+def _map(f):
+    # The mapping stays valid after the file is closed. Empty files can't be mapped
+    # (and aren't archives).
+    if os.fstat(f.fileno()).st_size == 0:
+        return b""
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class MappedArchive:
+    """
+    Reads an MPQ archive straight from a buffer, usually a read-only mmap of the
+    replay file. The header and the hash and block tables are parsed once when the
+    archive is opened. read_file() returns memoryview slices of the buffer and only
+    copies what it has to decompress.
+
+    Exposes the parts of mpyq.MPQArchive's interface that this package uses
+    (header, hash_table, block_table, get_hash_table_entry, read_file).
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self._view = memoryview(buffer).cast("B")
+        self.header = self._read_header()
+        self.hash_table = [
+            HashTableEntry._make(entry) for entry in self._read_table("hash", "<2I2HI")
+        ]
+        self.block_table = [
+            BlockTableEntry._make(entry) for entry in self._read_table("block", "<4I")
+        ]
+        self._hash_entries = {
+            (entry.hash_a, entry.hash_b): entry for entry in reversed(self.hash_table)
+        }
+        self._prefetched = {}
+
+    def _read_header(self):
+        view = self._view
+        magic = bytes(view[:4])
+        if magic == b"MPQ\x1b":
+            user_data_header = dict(
+                zip(
+                    ("magic", "user_data_size", "mpq_header_offset"),
+                    struct.unpack_from("<4s2I", view),
+                )
+            )
+            user_data_header["user_data_header_size"] = size = struct.unpack_from(
+                "<I", view, 12
+            )[0]
+            user_data_header["content"] = view[16 : 16 + size]
+            offset = user_data_header["mpq_header_offset"]
+        elif magic == b"MPQ\x1a":
+            user_data_header = None
+            offset = 0
+        else:
+            raise ValueError("Invalid file header.")
+
+        header = dict(
+            zip(
+                (
+                    "magic",
+                    "header_size",
+                    "archive_size",
+                    "format_version",
+                    "sector_size_shift",
+                    "hash_table_offset",
+                    "block_table_offset",
+                    "hash_table_entries",
+                    "block_table_entries",
+                ),
+                struct.unpack_from("<4s2I2H4I", view, offset),
+            )
+        )
+        header["offset"] = offset
+        if user_data_header is not None:
+            header["user_data_header"] = user_data_header
+        return header
+
+    def _read_table(self, table_type, entry_format):
+        offset = self.header[f"{table_type}_table_offset"] + self.header["offset"]
+        entries = self.header[f"{table_type}_table_entries"]
+        data = self._view[offset : offset + entries * 16]
+        if len(data) != entries * 16:
+            raise ValueError(f"Truncated {table_type} table.")
+        data = _decrypt(data, _hash(f"({table_type} table)", _HASH_TABLE))
+        return struct.iter_unpack(entry_format, data)
+
+    def get_hash_table_entry(self, filename) -> HashTableEntry | None:
+        return self._hash_entries.get(
+            (_hash(filename, _HASH_A), _hash(filename, _HASH_B))
+        )
+
+    def prefetch(self, filenames, executor):
+        """
+        Starts decompressing filenames on executor (a ThreadPoolExecutor), split
+        into batches of sectors that are decompressed concurrently; zlib and bz2
+        release the GIL while they work. read_file() then joins the batches instead
+        of decompressing the file itself.
+        """
+        for filename in filenames:
+            if filename in self._prefetched:
+                continue
+            parts = self._parts(filename)
+            if isinstance(parts, list):
+                self._prefetched[filename] = [
+                    executor.submit(_decompress_parts, parts[i : i + _PREFETCH_BATCH])
+                    for i in range(0, len(parts), _PREFETCH_BATCH)
+                ]
+
+    def read_file(self, filename) -> memoryview | bytes | None:
+        """
+        Returns the contents of a file in the archive: a memoryview of the archive's
+        buffer if the file is stored uncompressed, bytes otherwise. None if the
+        archive doesn't contain the file.
+        """
+        batches = self._prefetched.pop(filename, None)
+        if batches is not None:
+            return b"".join(part for batch in batches for part in batch.result())
+        parts = self._parts(filename)
+        if isinstance(parts, list):
+            return b"".join(_decompress_parts(parts))
+        return parts
+
+    def _parts(self, filename):
+        # The contents of the file if there is nothing to decompress, otherwise a
+        # list of its (sector, compressed) parts
+        hash_entry = self.get_hash_table_entry(filename)
+        if hash_entry is None:
+            return None
+        block_entry = self.block_table[hash_entry.block_table_index]
+        if not block_entry.flags & _MPQ_FILE_EXISTS or block_entry.archived_size == 0:
+            return None
+        if block_entry.flags & _MPQ_FILE_ENCRYPTED:
+            raise NotImplementedError("Encryption is not supported yet.")
+
+        offset = block_entry.offset + self.header["offset"]
+        data = self._view[offset : offset + block_entry.archived_size]
+        compressed = block_entry.flags & _MPQ_FILE_COMPRESS
+        if block_entry.flags & _MPQ_FILE_SINGLE_UNIT:
+            # Files are only compressed if that saves at least a byte
+            if compressed and block_entry.size > block_entry.archived_size:
+                return [(data, True)]
+            return data
+
+        # The file is split into sectors, each compressed on its own, preceded by a
+        # table of their offsets
+        sector_size = 512 << self.header["sector_size_shift"]
+        sectors = -(-block_entry.size // sector_size)
+        positions = struct.unpack_from(f"<{sectors + 1}I", data)
+        if not compressed or positions[-1] - positions[0] == block_entry.size:
+            # Nothing was compressed; the sectors are contiguous
+            return data[positions[0] : positions[-1]]
+        parts = []
+        for i, (start, end) in enumerate(zip(positions, positions[1:])):
+            size = min(sector_size, block_entry.size - i * sector_size)
+            parts.append((data[start:end], end - start < size))
+        return parts
+
+    def close(self):
+        # Prefetched files that were never read (e.g. the replay was filtered out)
+        batches = [batch for file in self._prefetched.values() for batch in file]
+        for batch in batches:
+            batch.cancel()
+        wait(batches)
+        self._prefetched.clear()
+        self._view.release()
+        if isinstance(self._buffer, mmap.mmap):
+            try:
+                self._buffer.close()
+            except BufferError:
+                # Slices returned by read_file are still in use; the mapping is
+                # closed when the last of them is released
+                pass
+
+
+def _decompress_parts(parts):
+    return [_decompress(data) if compressed else data for data, compressed in parts]
+
+
+def _decompress(data):
+    compression_type = data[0]
+    if compression_type == 0:
+        return data
+    elif compression_type == 2:
+        return zlib.decompress(data[1:], 15)
+    elif compression_type == 16:
+        return bz2.decompress(data[1:])
+    else:
+        raise RuntimeError("Unsupported compression type.")
+
+
+def _encryption_table():
+    seed = 0x00100001
+    table = [0] * 0x500
+    for i in range(0x100):
+        for j in range(5):
+            seed = (seed * 125 + 3) % 0x2AAAAB
+            high = (seed & 0xFFFF) << 0x10
+            seed = (seed * 125 + 3) % 0x2AAAAB
+            table[i + j * 0x100] = high | (seed & 0xFFFF)
+    return table
+
+
+_ENCRYPTION_TABLE = _encryption_table()
+# Hash types; table offsets are only needed to write archives
+_HASH_TABLE_OFFSET = 0
+_HASH_A = 1
+_HASH_B = 2
+_HASH_TABLE = 3
+
+
+@lru_cache(maxsize=None)
+def _hash(string, hash_type):
+    # Archives are looked up by the same few names, so hashes are computed once
+    seed1 = 0x7FED7FED
+    seed2 = 0xEEEEEEEE
+    for ch in string.upper().encode():
+        value = _ENCRYPTION_TABLE[(hash_type << 8) + ch]
+        seed1 = (value ^ (seed1 + seed2)) & 0xFFFFFFFF
+        seed2 = ch + seed1 + seed2 + (seed2 << 5) + 3 & 0xFFFFFFFF
+    return seed1
+
+
+def _decrypt(data, key):
+    seed1 = key
+    seed2 = 0xEEEEEEEE
+    values = []
+    for (value,) in struct.iter_unpack("<I", data):
+        seed2 = (seed2 + _ENCRYPTION_TABLE[0x400 + (seed1 & 0xFF)]) & 0xFFFFFFFF
+        value = (value ^ (seed1 + seed2)) & 0xFFFFFFFF
+        seed1 = (((~seed1 << 0x15) + 0x11111111) | (seed1 >> 0x0B)) & 0xFFFFFFFF
+        seed2 = value + seed2 + (seed2 << 5) + 3 & 0xFFFFFFFF
+        values.append(value)
+    return struct.pack(f"<{len(values)}I", *values)
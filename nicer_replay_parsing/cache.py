@@ -0,0 +1,196 @@
+from importlib.metadata import PackageNotFoundError, version
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+
+from .model import Replay
+
+try:
+    LIBRARY_VERSION = version("nicer-replay-parsing")
+except PackageNotFoundError:
+    LIBRARY_VERSION = "unknown"
+
+# Bumped whenever pickled models stop loading into the current classes
+_CACHE_FORMAT = 2
+_CACHE_VERSION = f"{LIBRARY_VERSION}/{_CACHE_FORMAT}"
+
+# Hits only record their time of access if the last one is older than this (in
+# seconds), so reading from the cache rarely has to write to it
+_ACCESS_RESOLUTION = 60
+_EVICT_BATCH = 100
+
+
+class ReplayCache:
+    """
+    On-disk cache of parsed replays, stored in a SQLite database in `directory`.
+
+    Files are looked up by path, size and mtime first and by a hash of their contents
+    second, so moved or touched replays still hit. Entries written by another version
+    of this library are dropped. If `max_size` (in bytes) is given, the least recently
+    used entries are evicted once the cached data grows past it. Access times are kept
+    to the minute, which is all the eviction order needs.
+    """
+
+    def __init__(self, directory, max_size=None):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+        self._last_hash = (None, None)
+        self._connection = sqlite3.connect(
+            os.path.join(directory, "replays.sqlite3"), timeout=60
+        )
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS replays (
+                    content_hash TEXT NOT NULL,
+                    mode TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    version TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (content_hash, mode)
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS replays_file"
+                " ON replays (path, size, mtime_ns, mode)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS replays_last_access"
+                " ON replays (last_access)"
+            )
+            # The total size of the cached data, kept up to date by triggers so that
+            # every process writing to the cache sees it
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_size (total INTEGER NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS replays_insert AFTER INSERT ON replays"
+                " BEGIN UPDATE cache_size SET total = total + LENGTH(NEW.data); END"
+            )
+            self._connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS replays_delete AFTER DELETE ON replays"
+                " BEGIN UPDATE cache_size SET total = total - LENGTH(OLD.data); END"
+            )
+            self._connection.execute(
+                "INSERT INTO cache_size SELECT COALESCE(SUM(LENGTH(data)), 0)"
+                " FROM replays WHERE NOT EXISTS (SELECT 1 FROM cache_size)"
+            )
+            self._connection.execute(
+                "DELETE FROM replays WHERE version != ?", (_CACHE_VERSION,)
+            )
+
+    def __reduce__(self):
+        # Lets the cache be handed to worker processes, which open their own connection
+        return (ReplayCache, (self.directory, self.max_size))
+
+    def get(self, filepath, mode="full") -> Replay | None:
+        identity = _file_identity(filepath)
+        # Processes of other library versions can share the cache, and their entries
+        # are only deleted when a cache is opened
+        row = self._connection.execute(
+            "SELECT content_hash, data, last_access FROM replays"
+            " WHERE path = ? AND size = ? AND mtime_ns = ? AND mode = ?"
+            " AND version = ?",
+            (*identity, mode, _CACHE_VERSION),
+        ).fetchone()
+        moved = row is None
+        if moved:
+            content_hash = _content_hash(filepath)
+            # put() reuses the hash after a miss
+            self._last_hash = (identity, content_hash)
+            row = self._connection.execute(
+                "SELECT content_hash, data, last_access FROM replays"
+                " WHERE content_hash = ? AND mode = ? AND version = ?",
+                (content_hash, mode, _CACHE_VERSION),
+            ).fetchone()
+            if row is None:
+                return None
+        now = time.time()
+        if moved or row[2] < now - _ACCESS_RESOLUTION:
+            with self._connection:
+                self._connection.execute(
+                    "UPDATE replays"
+                    " SET path = ?, size = ?, mtime_ns = ?, last_access = ?"
+                    " WHERE content_hash = ? AND mode = ?",
+                    (*identity, now, row[0], mode),
+                )
+        return pickle.loads(row[1])
+
+    def put(self, filepath, replay: Replay, mode="full"):
+        identity = _file_identity(filepath)
+        path, size, mtime_ns = identity
+        if self._last_hash[0] == identity:
+            content_hash = self._last_hash[1]
+        else:
+            content_hash = _content_hash(filepath)
+        with self._connection:
+            # Not INSERT OR REPLACE, whose deletes don't fire the size trigger
+            self._connection.execute(
+                "DELETE FROM replays WHERE content_hash = ? AND mode = ?",
+                (content_hash, mode),
+            )
+            self._connection.execute(
+                "INSERT INTO replays VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    content_hash,
+                    mode,
+                    path,
+                    size,
+                    mtime_ns,
+                    _CACHE_VERSION,
+                    pickle.dumps(replay, pickle.HIGHEST_PROTOCOL),
+                    time.time(),
+                ),
+            )
+        if self.max_size is not None:
+            self.evict(self.max_size)
+
+    def evict(self, max_size):
+        with self._connection:
+            total = self.size()
+            while total > max_size:
+                rows = self._connection.execute(
+                    "SELECT content_hash, mode, LENGTH(data) FROM replays"
+                    " ORDER BY last_access LIMIT ?",
+                    (_EVICT_BATCH,),
+                ).fetchall()
+                if not rows:
+                    break
+                evicted = []
+                for content_hash, mode, size in rows:
+                    if total <= max_size:
+                        break
+                    evicted.append((content_hash, mode))
+                    total -= size
+                self._connection.executemany(
+                    "DELETE FROM replays WHERE content_hash = ? AND mode = ?", evicted
+                )
+
+    def size(self) -> int:
+        """The total size of the cached data in bytes."""
+        return self._connection.execute("SELECT total FROM cache_size").fetchone()[0]
+
+    def clear(self):
+        with self._connection:
+            self._connection.execute("DELETE FROM replays")
+
+    def close(self):
+        self._connection.close()
+
+
+def _file_identity(filepath):
+    stat = os.stat(filepath)
+    return os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns
+
+
+def _content_hash(filepath):
+    with open(filepath, "rb") as f:
+        return hashlib.file_digest(f, "sha1").hexdigest()
@@ -0,0 +1,376 @@
+from datetime import datetime
+from itertools import islice
+import sqlite3
+
+from .filters import ReplayFilter
+from .model import (
+    Battleground,
+    DraftAction,
+    DraftActionType,
+    Gamemode,
+    Hero,
+    Player,
+    Replay,
+    Team,
+    Version,
+    _decode,
+)
+
+# Stored in PRAGMA user_version. 1: battletags can be NULL, durations are REAL and
+# display names TEXT.
+_SCHEMA_VERSION = 1
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS replays (
+        id TEXT PRIMARY KEY,
+        base_build INTEGER NOT NULL,
+        major INTEGER NOT NULL,
+        minor INTEGER NOT NULL,
+        revision INTEGER NOT NULL,
+        build INTEGER NOT NULL,
+        flags INTEGER,
+        gamemode TEXT NOT NULL,
+        duration REAL,
+        date TEXT NOT NULL,
+        battleground TEXT NOT NULL,
+        incomplete INTEGER,
+        winner TEXT,
+        firstpick TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS players (
+        replay_id TEXT NOT NULL,
+        team TEXT NOT NULL,
+        slot INTEGER NOT NULL,
+        toon_handle TEXT NOT NULL,
+        display_name TEXT NOT NULL,
+        battletag TEXT,
+        PRIMARY KEY (replay_id, team, slot)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS heroes (
+        replay_id TEXT NOT NULL,
+        team TEXT NOT NULL,
+        slot INTEGER NOT NULL,
+        hero TEXT NOT NULL,
+        PRIMARY KEY (replay_id, team, slot)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS draft (
+        replay_id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        team TEXT NOT NULL,
+        hero TEXT,
+        PRIMARY KEY (replay_id, position)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS replays_date ON replays (date)",
+    "CREATE INDEX IF NOT EXISTS replays_battleground ON replays (battleground, date)",
+    "CREATE INDEX IF NOT EXISTS replays_gamemode ON replays (gamemode, date)",
+    "CREATE INDEX IF NOT EXISTS players_toon_handle ON players (toon_handle)",
+    "CREATE INDEX IF NOT EXISTS heroes_hero ON heroes (hero)",
+)
+
+
+class ReplayDatabase:
+    """
+    Parsed replays stored in an indexed SQLite database, with the tables replays,
+    players, heroes and draft. Enums are stored by name (e.g. CURSED_HOLLOW), dates
+    as ISO 8601 text and display names as text (so they are read back as str), so
+    the database can also be queried with plain SQL.
+
+    Query with ReplayFilters, e.g. the replays of a player on a battleground since a
+    date:
+
+        database.query(ReplayFilter(
+            toon_handles=[toon_handle],
+            battlegrounds=[Battleground.CURSED_HOLLOW],
+            after=datetime(2022, 1, 1),
+        ))
+    """
+
+    def __init__(self, path, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self._connection = sqlite3.connect(path, timeout=60)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+            if version < _SCHEMA_VERSION:
+                self._migrate()
+            for statement in _SCHEMA:
+                self._connection.execute(statement)
+            self._connection.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    def _migrate(self):
+        # Databases from before user_version was set. Column constraints can't be
+        # altered, so players is copied into a new table; the type of
+        # replays.duration only changes its affinity, which already kept floats.
+        exists = self._connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'players'"
+        ).fetchone()
+        if exists is None:
+            return
+        self._connection.execute("ALTER TABLE players RENAME TO players_old")
+        self._connection.execute("DROP INDEX IF EXISTS players_toon_handle")
+        self._connection.execute(_SCHEMA[1])
+        self._connection.execute(
+            "INSERT INTO players SELECT replay_id, team, slot, toon_handle,"
+            " CAST(display_name AS TEXT), battletag FROM players_old"
+        )
+        self._connection.execute("DROP TABLE players_old")
+
+    def __reduce__(self):
+        # Like ReplayCache, worker processes open their own connection
+        return (ReplayDatabase, (self.path, self.batch_size))
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM replays").fetchone()[0]
+
+    def __contains__(self, replay_id):
+        return (
+            self._connection.execute(
+                "SELECT 1 FROM replays WHERE id = ?", (replay_id,)
+            ).fetchone()
+            is not None
+        )
+
+    def add(self, replay: Replay):
+        self.add_all([replay])
+
+    def add_all(self, replays) -> int:
+        """
+        Inserts (or replaces) replays from any iterable, e.g. iter_replays(...),
+        batch_size replays per transaction. Returns how many were inserted.
+        """
+        count = 0
+        replays = iter(replays)
+        while batch := list(islice(replays, self.batch_size)):
+            self._insert(batch)
+            count += len(batch)
+        return count
+
+    def _insert(self, replays):
+        replay_rows = []
+        player_rows = []
+        hero_rows = []
+        draft_rows = []
+        # Every player of a match uploads the same replay, so a batch can hold an id
+        # more than once; the last one replaces the others like in separate batches
+        replays = {replay.id: replay for replay in replays}.values()
+        for replay in replays:
+            version = replay.version
+            replay_rows.append(
+                (
+                    replay.id,
+                    version.base_build,
+                    version.major,
+                    version.minor,
+                    version.revision,
+                    version.build,
+                    version.flags,
+                    replay.gamemode.name,
+                    replay.duration,
+                    _format_date(replay.date),
+                    replay.battleground.name,
+                    replay.incomplete,
+                    _name(replay.winner),
+                    _name(replay.firstpick),
+                )
+            )
+            for team, players, heroes in zip(Team, replay.players, replay.heroes):
+                for slot, player in enumerate(players):
+                    player_rows.append(
+                        (
+                            replay.id,
+                            team.name,
+                            slot,
+                            player.id,
+                            _decode(player.display_name),
+                            player.battletag,
+                        )
+                    )
+                for slot, hero in enumerate(heroes):
+                    hero_rows.append((replay.id, team.name, slot, hero.name))
+            for position, action in enumerate(replay.draft or ()):
+                draft_rows.append(
+                    (
+                        replay.id,
+                        position,
+                        action.type.name,
+                        action.team.name,
+                        _name(action.hero),
+                    )
+                )
+
+        ids = [(row[0],) for row in replay_rows]
+        with self._connection:
+            # Replaced replays drop their old players, heroes and draft
+            for table in ("players", "heroes", "draft"):
+                self._connection.executemany(
+                    f"DELETE FROM {table} WHERE replay_id = ?", ids
+                )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO replays"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                replay_rows,
+            )
+            self._connection.executemany(
+                "INSERT INTO players VALUES (?, ?, ?, ?, ?, ?)", player_rows
+            )
+            self._connection.executemany(
+                "INSERT INTO heroes VALUES (?, ?, ?, ?)", hero_rows
+            )
+            self._connection.executemany(
+                "INSERT INTO draft VALUES (?, ?, ?, ?, ?)", draft_rows
+            )
+
+    def get(self, replay_id) -> Replay | None:
+        replays = self._load("id = ?", [replay_id])
+        return replays[0] if replays else None
+
+    def query(self, replay_filter: ReplayFilter | None = None) -> list[Replay]:
+        """The replays matching replay_filter (all of them without one), by date."""
+        return self._load(*_where(replay_filter))
+
+    def count(self, replay_filter: ReplayFilter | None = None) -> int:
+        where, parameters = _where(replay_filter)
+        return self._connection.execute(
+            f"SELECT COUNT(*) FROM replays WHERE {where}", parameters
+        ).fetchone()[0]
+
+    def replay_ids(self, replay_filter: ReplayFilter | None = None) -> set[str]:
+        """The ids of the matching replays, e.g. to pass as known_replay_ids."""
+        where, parameters = _where(replay_filter)
+        rows = self._connection.execute(
+            f"SELECT id FROM replays WHERE {where}", parameters
+        )
+        return {replay_id for replay_id, in rows}
+
+    def _load(self, where, parameters):
+        selected = f"SELECT id FROM replays WHERE {where}"
+        players = {}
+        for (
+            replay_id,
+            team,
+            toon_handle,
+            display_name,
+            battletag,
+        ) in self._connection.execute(
+            "SELECT replay_id, team, toon_handle, display_name, battletag"
+            f" FROM players WHERE replay_id IN ({selected})"
+            " ORDER BY replay_id, team, slot",
+            parameters,
+        ):
+            teams = players.setdefault(replay_id, ([], []))
+            teams[Team[team] is Team.RIGHT].append(
+                Player(toon_handle, display_name, battletag)
+            )
+        heroes = {}
+        for replay_id, team, hero in self._connection.execute(
+            "SELECT replay_id, team, hero"
+            f" FROM heroes WHERE replay_id IN ({selected})"
+            " ORDER BY replay_id, team, slot",
+            parameters,
+        ):
+            teams = heroes.setdefault(replay_id, ([], []))
+            teams[Team[team] is Team.RIGHT].append(Hero[hero])
+        drafts = {}
+        for replay_id, action_type, team, hero in self._connection.execute(
+            "SELECT replay_id, type, team, hero"
+            f" FROM draft WHERE replay_id IN ({selected})"
+            " ORDER BY replay_id, position",
+            parameters,
+        ):
+            drafts.setdefault(replay_id, []).append(
+                DraftAction(
+                    DraftActionType[action_type],
+                    Team[team],
+                    Hero[hero] if hero is not None else None,
+                )
+            )
+
+        replays = []
+        for row in self._connection.execute(
+            f"SELECT * FROM replays WHERE {where} ORDER BY date, id", parameters
+        ):
+            replay_id = row[0]
+            team_players = players.get(replay_id, ([], []))
+            team_heroes = heroes.get(replay_id, ([], []))
+            replays.append(
+                Replay(
+                    replay_id,
+                    Version(*row[1:7]),
+                    Gamemode[row[7]],
+                    row[8],
+                    datetime.fromisoformat(row[9]),
+                    (tuple(team_players[0]), tuple(team_players[1])),
+                    (tuple(team_heroes[0]), tuple(team_heroes[1])),
+                    Battleground[row[10]],
+                    bool(row[11]) if row[11] is not None else None,
+                    Team[row[12]] if row[12] is not None else None,
+                    drafts.get(replay_id),
+                    Team[row[13]] if row[13] is not None else None,
+                )
+            )
+        return replays
+
+    def close(self):
+        self._connection.close()
+
+
+def _where(replay_filter):
+    # Translates a ReplayFilter into a WHERE clause on replays and its parameters
+    conditions = []
+    parameters = []
+    if replay_filter is None:
+        return "1", parameters
+    if replay_filter.min_build is not None:
+        conditions.append("base_build >= ?")
+        parameters.append(replay_filter.min_build)
+    if replay_filter.max_build is not None:
+        conditions.append("base_build <= ?")
+        parameters.append(replay_filter.max_build)
+    if replay_filter.after is not None:
+        conditions.append("date >= ?")
+        parameters.append(_format_date(replay_filter.after))
+    if replay_filter.before is not None:
+        conditions.append("date <= ?")
+        parameters.append(_format_date(replay_filter.before))
+    for column, values in (
+        ("gamemode", replay_filter.gamemodes),
+        ("battleground", replay_filter.battlegrounds),
+    ):
+        if values:
+            conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+            parameters += [value.name for value in values]
+    if replay_filter.toon_handles:
+        conditions.append(
+            _in_subquery("players", "toon_handle", replay_filter.toon_handles)
+        )
+        parameters += list(replay_filter.toon_handles)
+    if replay_filter.heroes:
+        conditions.append(_in_subquery("heroes", "hero", replay_filter.heroes))
+        parameters += [hero.name for hero in replay_filter.heroes]
+    return " AND ".join(conditions) or "1", parameters
+
+
+def _in_subquery(table, column, values):
+    return (
+        f"id IN (SELECT replay_id FROM {table}"
+        f" WHERE {column} IN ({', '.join('?' * len(values))}))"
+    )
+
+
+def _format_date(date):
+    # Fixed width, so dates compare correctly as text
+    return date.isoformat(" ", "microseconds")
+
+
+def _name(value):
+    return value.name if value is not None else None
@@ -0,0 +1,79 @@
+from datetime import datetime
+
+from .model import Battleground, Gamemode, Replay, Version
+
+
+class ReplayFilter:
+    """
+    Predicates for parse_replay. Every given predicate has to match. Each one is
+    checked as soon as the stage that provides its inputs has been decoded, so
+    replays that don't match are dropped before the more expensive stages:
+
+    - header: min_build, max_build (base builds, inclusive)
+    - details: after, before (dates), battlegrounds, toon_handles and heroes (the
+      replay matches if any of its players / heroes is in the collection)
+    - initdata: gamemodes
+    """
+
+    def __init__(
+        self,
+        gamemodes=None,
+        battlegrounds=None,
+        min_build: int | None = None,
+        max_build: int | None = None,
+        after: datetime | None = None,
+        before: datetime | None = None,
+        toon_handles=None,
+        heroes=None,
+    ):
+        self.gamemodes = gamemodes
+        self.battlegrounds = battlegrounds
+        self.min_build = min_build
+        self.max_build = max_build
+        self.after = after
+        self.before = before
+        self.toon_handles = toon_handles
+        self.heroes = heroes
+
+    def check_header(self, version: Version) -> bool:
+        if self.min_build is not None and version.base_build < self.min_build:
+            return False
+        if self.max_build is not None and version.base_build > self.max_build:
+            return False
+        return True
+
+    def check_details(
+        self,
+        date: datetime,
+        battleground: Battleground,
+        toon_handles,
+        heroes,
+    ) -> bool:
+        if self.after is not None and date < self.after:
+            return False
+        if self.before is not None and date > self.before:
+            return False
+        if self.battlegrounds and battleground not in self.battlegrounds:
+            return False
+        if self.toon_handles and not any(
+            toon_handle in self.toon_handles for toon_handle in toon_handles
+        ):
+            return False
+        if self.heroes and not any(hero in self.heroes for hero in heroes):
+            return False
+        return True
+
+    def check_initdata(self, gamemode: Gamemode) -> bool:
+        return not self.gamemodes or gamemode in self.gamemodes
+
+    def matches(self, replay: Replay) -> bool:
+        return (
+            self.check_header(replay.version)
+            and self.check_details(
+                replay.date,
+                replay.battleground,
+                [player.id for team in replay.players for player in team],
+                [hero for team in replay.heroes for hero in team],
+            )
+            and self.check_initdata(replay.gamemode)
+        )
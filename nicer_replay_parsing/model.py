@@ -1,15 +1,67 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
+import math
+import struct
 
 
-class Version:
+class _Value:
+    # Slotted and read-only once built; compared and hashed by its slots' values
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def _from_values(cls, values):
+        self = object.__new__(cls)
+        _Value.__init__(self, *values)
+        return self
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __reduce__(self):
+        return (type(self)._from_values, (self._values(),))
+
+    def __setstate__(self, state):
+        _set_slots(self, state)
+
+
+def _set_slots(self, state):
+    # Pickles of the dict-based models from before they were slotted have a dict as
+    # their state; slotted objects without __reduce__ have (None, slots)
+    if isinstance(state, tuple):
+        state = {**(state[0] or {}), **state[1]}
+    for name, value in state.items():
+        object.__setattr__(self, name, value)
+
+
+class Version(_Value):
+    __slots__ = ("base_build", "major", "minor", "revision", "build", "flags")
+    base_build: int
+    major: int
+    minor: int
+    revision: int
+    build: int
+    flags: int | None
+
     def __init__(self, base_build, major, minor, revision, build, flags):
-        self.base_build: int = base_build
-        self.major: int = major
-        self.minor: int = minor
-        self.revision: int = revision
-        self.build: int = build
-        self.flags: int | None = flags
+        super().__init__(base_build, major, minor, revision, build, flags)
 
     def __str__(self):
         return f"{self.major}.{self.minor}.{self.revision}.{self.build}"
@@ -23,11 +75,14 @@ class Team(Enum):
         return self.value
 
 
-class Player:
+class Player(_Value):
+    __slots__ = ("id", "display_name", "battletag")
+    id: str
+    display_name: str
+    battletag: str
+
     def __init__(self, id, display_name, battletag):
-        self.id: str = id
-        self.display_name: str = display_name
-        self.battletag: str = battletag
+        super().__init__(id, display_name, battletag)
 
     def __str__(self):
         return self.battletag
@@ -58,11 +113,14 @@ class DraftActionType(Enum):
         return self.value
 
 
-class DraftAction:
-    def __init__(self, type: DraftActionType, team: Team, hero: Hero | None = None):
-        self.type: DraftActionType = type
-        self.team: Team = team
-        self.hero: Hero | None = hero
+class DraftAction(_Value):
+    __slots__ = ("type", "team", "hero")
+    type: DraftActionType
+    team: Team
+    hero: "Hero | None"
+
+    def __init__(self, type: DraftActionType, team: Team, hero: "Hero | None" = None):
+        super().__init__(type, team, hero)
 
     def __str__(self):
         return f"{self.type} {self.team} {self.hero}"
@@ -237,6 +295,21 @@ class Battleground(Enum):
 
 
 class Replay:
+    __slots__ = (
+        "id",
+        "version",
+        "gamemode",
+        "duration",
+        "date",
+        "players",
+        "heroes",
+        "battleground",
+        "incomplete",
+        "winner",
+        "draft",
+        "firstpick",
+    )
+
     def __init__(
         self,
         replay_id: str,
@@ -265,6 +338,9 @@ class Replay:
         self.draft: list[DraftAction] | None = draft
         self.firstpick: Team | None = firstpick
 
+    def __setstate__(self, state):
+        _set_slots(self, state)
+
     def __str__(self):
         return str(
             {
@@ -288,3 +364,619 @@ class Replay:
         from .util import import_heroprotocol
 
         return import_heroprotocol(self.version.base_build)
+
+    def to_bytes(self) -> bytes:
+        """
+        Encodes the replay in a compact, versioned binary format: enums as small
+        integer codes, fixed-width numbers and length-prefixed strings.
+        """
+        return _replay_to_bytes(self)
+
+    @staticmethod
+    def from_bytes(data) -> "Replay":
+        return _replay_from_bytes(data)
+
+    def to_dict(self) -> dict:
+        """
+        The replay as a dict of JSON types. Enums are stored by name, and display
+        names (the raw bytes of the replay when parsed) are decoded to str.
+        """
+        return {
+            "id": self.id,
+            "version": {
+                "base_build": self.version.base_build,
+                "major": self.version.major,
+                "minor": self.version.minor,
+                "revision": self.version.revision,
+                "build": self.version.build,
+                "flags": self.version.flags,
+            },
+            "gamemode": self.gamemode.name,
+            "duration": self.duration,
+            "date": self.date.isoformat(),
+            "players": [
+                [
+                    {
+                        "id": player.id,
+                        "display_name": _decode(player.display_name),
+                        "battletag": player.battletag,
+                    }
+                    for player in team
+                ]
+                for team in self.players
+            ],
+            "heroes": [[hero.name for hero in team] for team in self.heroes],
+            "battleground": self.battleground.name,
+            "incomplete": self.incomplete,
+            "winner": _name(self.winner),
+            "draft": (
+                [
+                    {
+                        "type": action.type.name,
+                        "team": action.team.name,
+                        "hero": _name(action.hero),
+                    }
+                    for action in self.draft
+                ]
+                if self.draft is not None
+                else None
+            ),
+            "firstpick": _name(self.firstpick),
+        }
+
+    @staticmethod
+    def from_dict(data) -> "Replay":
+        draft = data["draft"]
+        if draft is not None:
+            draft = [
+                DraftAction(
+                    DraftActionType[action["type"]],
+                    Team[action["team"]],
+                    Hero[action["hero"]] if action["hero"] is not None else None,
+                )
+                for action in draft
+            ]
+        return Replay(
+            data["id"],
+            Version(**data["version"]),
+            Gamemode[data["gamemode"]],
+            data["duration"],
+            datetime.fromisoformat(data["date"]),
+            tuple(
+                tuple(
+                    Player(player["id"], player["display_name"], player["battletag"])
+                    for player in team
+                )
+                for team in data["players"]
+            ),
+            tuple(tuple(Hero[hero] for hero in team) for team in data["heroes"]),
+            Battleground[data["battleground"]],
+            data["incomplete"],
+            Team[data["winner"]] if data["winner"] is not None else None,
+            draft,
+            Team[data["firstpick"]] if data["firstpick"] is not None else None,
+        )
+
+    def to_compact(self) -> "CompactReplay":
+        return CompactReplay(
+            self.id,
+            self.version,
+            self.gamemode,
+            self.duration,
+            self.date,
+            self.players,
+            self.heroes,
+            self.battleground,
+            self.incomplete,
+            self.winner,
+            self.draft,
+            self.firstpick,
+        )
+
+
+# Small integer codes for CompactReplay. Heroes are stored by id (as a byte, so
+# UNKNOWN is 255 and 0 means no hero), the other enums by their definition order.
+_HERO_CODES = {hero: hero.id & 0xFF for hero in Hero}
+_HEROES_BY_CODE = {code: hero for hero, code in _HERO_CODES.items()}
+_HERO_CODES[None] = 0
+_HEROES_BY_CODE[0] = None
+_GAMEMODES = tuple(Gamemode)
+_GAMEMODE_CODES = {gamemode: i for i, gamemode in enumerate(_GAMEMODES)}
+_BATTLEGROUNDS = tuple(Battleground)
+_BATTLEGROUND_CODES = {battleground: i for i, battleground in enumerate(_BATTLEGROUNDS)}
+_TEAMS = tuple(Team)
+_DRAFT_ACTION_TYPES = tuple(DraftActionType)
+
+# Every replay of a build has an equal Version, so CompactReplays share one
+_VERSIONS: dict[Version, Version] = {}
+
+
+class CompactReplay(_Value):
+    """
+    Immutable, slotted Replay for keeping large corpora in memory. It has the same
+    attributes as Replay, but stores the id as a 16-byte digest and the heroes,
+    draft, battleground and gamemode as small integer codes, which are turned back
+    into enums and DraftActions when accessed. Compared and hashed by value.
+    """
+
+    __slots__ = (
+        "_id",
+        "version",
+        "_gamemode",
+        "duration",
+        "date",
+        "players",
+        "_heroes",
+        "_battleground",
+        "incomplete",
+        "winner",
+        "_draft",
+        "firstpick",
+    )
+    version: Version
+    duration: int | None
+    date: datetime
+    players: tuple[tuple[Player, ...], tuple[Player, ...]]
+    incomplete: bool
+    winner: Team | None
+    firstpick: Team | None
+
+    def __init__(
+        self,
+        replay_id: str,
+        version: Version,
+        gamemode: Gamemode,
+        duration: int | None,
+        date: datetime,
+        players: tuple[tuple[Player, ...], tuple[Player, ...]],
+        heroes: tuple[tuple[Hero, ...], tuple[Hero, ...]],
+        battleground: Battleground,
+        incomplete: bool,
+        winner: Team | None = None,
+        draft: list[DraftAction] | None = None,
+        firstpick: Team | None = None,
+    ):
+        if draft is not None:
+            # Two bytes per action: type and team bits, then the hero
+            draft = bytes(
+                byte
+                for action in draft
+                for byte in (
+                    _DRAFT_ACTION_TYPES.index(action.type) << 1
+                    | _TEAMS.index(action.team),
+                    _HERO_CODES[action.hero],
+                )
+            )
+        super().__init__(
+            bytes.fromhex(replay_id),
+            _VERSIONS.setdefault(version, version),
+            _GAMEMODE_CODES[gamemode],
+            duration,
+            date,
+            players,
+            bytes(_HERO_CODES[hero] for team in heroes for hero in team),
+            _BATTLEGROUND_CODES[battleground],
+            incomplete,
+            winner,
+            draft,
+            firstpick,
+        )
+
+    @property
+    def id(self) -> str:
+        return self._id.hex()
+
+    @property
+    def gamemode(self) -> Gamemode:
+        return _GAMEMODES[self._gamemode]
+
+    @property
+    def heroes(self) -> tuple[tuple[Hero, ...], tuple[Hero, ...]]:
+        left = len(self.players[0])
+        return (
+            tuple(_HEROES_BY_CODE[code] for code in self._heroes[:left]),
+            tuple(_HEROES_BY_CODE[code] for code in self._heroes[left:]),
+        )
+
+    @property
+    def battleground(self) -> Battleground:
+        return _BATTLEGROUNDS[self._battleground]
+
+    @property
+    def draft(self) -> list[DraftAction] | None:
+        if self._draft is None:
+            return None
+        return [
+            DraftAction(
+                _DRAFT_ACTION_TYPES[self._draft[i] >> 1],
+                _TEAMS[self._draft[i] & 1],
+                _HEROES_BY_CODE[self._draft[i + 1]],
+            )
+            for i in range(0, len(self._draft), 2)
+        ]
+
+    __str__ = Replay.__str__
+    get_heroprotocol = Replay.get_heroprotocol
+    to_bytes = Replay.to_bytes
+    to_dict = Replay.to_dict
+
+    def to_replay(self) -> Replay:
+        return Replay(
+            self.id,
+            self.version,
+            self.gamemode,
+            self.duration,
+            self.date,
+            self.players,
+            self.heroes,
+            self.battleground,
+            self.incomplete,
+            self.winner,
+            self.draft,
+            self.firstpick,
+        )
+
+
+def _name(value):
+    return value.name if value is not None else None
+
+
+def _decode(string):
+    return string.decode("utf-8") if isinstance(string, bytes) else string
+
+
+# Codes of the enums in Replay.to_bytes(). They are part of the format, so new members
+# are only ever appended (unlike the definition order CompactReplay uses, which
+# changes when e.g. a battleground is added). Heroes are stored like in CompactReplay.
+_BYTES_FORMAT = 1
+_BYTES_GAMEMODES = (
+    Gamemode.VERSUS_AI,
+    Gamemode.PRACTICE,
+    Gamemode.QUICK_MATCH,
+    Gamemode.UNRANKED_DRAFT,
+    Gamemode.BRAWL,
+    Gamemode.ARAM,
+    Gamemode.CUSTOM,
+    Gamemode.HERO_LEAGUE,
+    Gamemode.TEAM_LEAGUE,
+    Gamemode.STORM_LEAGUE,
+    Gamemode.OTHER,
+)
+_BYTES_BATTLEGROUNDS = (
+    Battleground.ALTERAC_PASS,
+    Battleground.AZMODUNK,
+    Battleground.BASH_EM_SMASH_EM,
+    Battleground.BATTLEFIELD_OF_ETERNITY,
+    Battleground.BLACKHEARTS_BAY,
+    Battleground.BLACKHEARTS_REVENGE,
+    Battleground.BLOODLUST_BRAWL,
+    Battleground.BOOTY_COFFERS,
+    Battleground.BRAXIS_HOLDOUT,
+    Battleground.BRAXIS_OUTPOST,
+    Battleground.CHECKPOINT_HANAMURA,
+    Battleground.CURSED_HOLLOW,
+    Battleground.DEADMANS_STAND,
+    Battleground.DEADMANS_STAND_HEROIC,
+    Battleground.DODGE_BRAWL,
+    Battleground.DRAGON_SHIRE,
+    Battleground.ESCAPE_FROM_BRAXIS,
+    Battleground.ESCAPE_FROM_BRAXIS_HEROIC,
+    Battleground.GARDEN_ARENA,
+    Battleground.GARDEN_OF_TERROR,
+    Battleground.GARDEN_OF_TERROR_CLASSIC,
+    Battleground.GHOST_PROTOCOL,
+    Battleground.HALLOWS_END,
+    Battleground.HAMMER_TIME,
+    Battleground.HANAMURA_TEMPLE,
+    Battleground.HAUNTED_MINES,
+    Battleground.HEROES_OF_THE_STARS,
+    Battleground.INDUSTRIAL_DISTRICT,
+    Battleground.INFERNAL_SHRINES,
+    Battleground.LOST_CAVERN,
+    Battleground.LUNAR_ROCKET_RACING,
+    Battleground.MAGE_WARS,
+    Battleground.MINERAL_MADNESS,
+    Battleground.PULL_PARTY,
+    Battleground.PUNISHER_ARENA,
+    Battleground.SILVER_CITY,
+    Battleground.SNOW_BRAWL,
+    Battleground.SKY_TEMPLE,
+    Battleground.SPECIAL_DELIVERY,
+    Battleground.TEMPLE_ARENA,
+    Battleground.TOMB_OF_THE_SPIDER_QUEEN,
+    Battleground.TOWERS_OF_DOOM,
+    Battleground.TRIAL_GROUNDS,
+    Battleground.VOLSKAYA_FOUNDRY,
+    Battleground.WARHEAD_JUNCTION,
+    Battleground.OTHER,
+)
+_BYTES_GAMEMODE_CODES = {gamemode: i for i, gamemode in enumerate(_BYTES_GAMEMODES)}
+_BYTES_BATTLEGROUND_CODES = {
+    battleground: i for i, battleground in enumerate(_BYTES_BATTLEGROUNDS)
+}
+_BYTES_TEAMS = (Team.LEFT, Team.RIGHT)
+_BYTES_TEAM_CODES = {Team.LEFT: 0, Team.RIGHT: 1}
+_BYTES_DRAFT_ACTION_TYPES = (DraftActionType.BAN, DraftActionType.PICK)
+_BYTES_DRAFT_ACTION_TYPE_CODES = {DraftActionType.BAN: 0, DraftActionType.PICK: 1}
+
+# Format, id digest, version (base build, major, minor, revision, build, flags),
+# gamemode, duration, date (microseconds since 1970), battleground, incomplete, winner,
+# firstpick, a bit per field that is None (_MISSING_*), and the team sizes. Then the
+# players (three length-prefixed strings each), the heroes and the draft (two bytes
+# per action: type and team bits, then the hero). The top bit of a string's length
+# marks bytes (display names are stored as parsed), and _NO_STRING marks None.
+_BYTES_HEADER = struct.Struct("<B16sIHHHIiBdq9B")
+_STRING_LENGTH = struct.Struct("<H")
+_NO_STRING = 0xFFFF
+_BYTES_STRING = 0x8000
+_MISSING_FLAGS = 1
+_MISSING_DURATION = 2
+_MISSING_INCOMPLETE = 4
+_MISSING_WINNER = 8
+_MISSING_FIRSTPICK = 16
+_MISSING_DRAFT = 32
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _replay_to_bytes(replay):
+    version = replay.version
+    missing = 0
+    if version.flags is None:
+        missing |= _MISSING_FLAGS
+    if replay.duration is None:
+        missing |= _MISSING_DURATION
+    if replay.incomplete is None:
+        missing |= _MISSING_INCOMPLETE
+    if replay.winner is None:
+        missing |= _MISSING_WINNER
+    if replay.firstpick is None:
+        missing |= _MISSING_FIRSTPICK
+    draft = replay.draft
+    if draft is None:
+        missing |= _MISSING_DRAFT
+    players = replay.players
+    heroes = replay.heroes
+
+    parts = [
+        _BYTES_HEADER.pack(
+            _BYTES_FORMAT,
+            bytes.fromhex(replay.id),
+            version.base_build,
+            version.major,
+            version.minor,
+            version.revision,
+            version.build,
+            version.flags or 0,
+            _BYTES_GAMEMODE_CODES[replay.gamemode],
+            replay.duration if replay.duration is not None else math.nan,
+            (replay.date - _EPOCH) // _MICROSECOND,
+            _BYTES_BATTLEGROUND_CODES[replay.battleground],
+            bool(replay.incomplete),
+            _BYTES_TEAM_CODES.get(replay.winner, 0),
+            _BYTES_TEAM_CODES.get(replay.firstpick, 0),
+            missing,
+            len(players[0]),
+            len(players[1]),
+            len(heroes[0]),
+            len(heroes[1]),
+        )
+    ]
+    _encode_players(players, parts)
+    parts.append(bytes(_HERO_CODES[hero] for team in heroes for hero in team))
+    if draft is not None:
+        parts.append(
+            bytes(
+                byte
+                for action in draft
+                for byte in (
+                    _BYTES_DRAFT_ACTION_TYPE_CODES[action.type] << 1
+                    | _BYTES_TEAM_CODES[action.team],
+                    _HERO_CODES[action.hero],
+                )
+            )
+        )
+    return b"".join(parts)
+
+
+def _encode_players(players, parts):
+    # Appends the players of both teams to parts, as three strings each
+    for team in players:
+        for player in team:
+            for string in (player.id, player.display_name, player.battletag):
+                if string is None:
+                    parts.append(_STRING_LENGTH.pack(_NO_STRING))
+                elif isinstance(string, bytes):
+                    parts.append(_STRING_LENGTH.pack(len(string) | _BYTES_STRING))
+                    parts.append(string)
+                else:
+                    string = string.encode()
+                    parts.append(_STRING_LENGTH.pack(len(string)))
+                    parts.append(string)
+
+
+def _decode_players(data, position, sizes):
+    # The teams of sizes players encoded at position, and the position after them
+    players = ([], [])
+    for team, size in zip(players, sizes):
+        for _ in range(size):
+            strings = []
+            for _ in range(3):
+                (length,) = _STRING_LENGTH.unpack_from(data, position)
+                position += 2
+                if length == _NO_STRING:
+                    strings.append(None)
+                elif length & _BYTES_STRING:
+                    length &= ~_BYTES_STRING
+                    strings.append(bytes(data[position : position + length]))
+                    position += length
+                else:
+                    strings.append(str(data[position : position + length], "utf-8"))
+                    position += length
+            team.append(Player(*strings))
+    return (tuple(players[0]), tuple(players[1])), position
+
+
+def _replay_from_bytes(data):
+    data = memoryview(data).cast("B")
+    if data[0] != _BYTES_FORMAT:
+        raise ValueError(f"Unknown replay format {data[0]}")
+    (
+        _,
+        replay_id,
+        base_build,
+        major,
+        minor,
+        revision,
+        build,
+        flags,
+        gamemode,
+        duration,
+        date,
+        battleground,
+        incomplete,
+        winner,
+        firstpick,
+        missing,
+        *sizes,
+    ) = _BYTES_HEADER.unpack_from(data)
+    position = _BYTES_HEADER.size
+
+    players, position = _decode_players(data, position, sizes[:2])
+    heroes = []
+    for size in sizes[2:]:
+        heroes.append(
+            tuple(_HEROES_BY_CODE[code] for code in data[position : position + size])
+        )
+        position += size
+    draft = None
+    if not missing & _MISSING_DRAFT:
+        codes = data[position:]
+        draft = [
+            DraftAction(
+                _BYTES_DRAFT_ACTION_TYPES[codes[i] >> 1],
+                _BYTES_TEAMS[codes[i] & 1],
+                _HEROES_BY_CODE[codes[i + 1]],
+            )
+            for i in range(0, len(codes), 2)
+        ]
+
+    return Replay(
+        replay_id.hex(),
+        Version(
+            base_build,
+            major,
+            minor,
+            revision,
+            build,
+            None if missing & _MISSING_FLAGS else flags,
+        ),
+        _BYTES_GAMEMODES[gamemode],
+        None if missing & _MISSING_DURATION else duration,
+        _EPOCH + date * _MICROSECOND,
+        players,
+        (heroes[0], heroes[1]),
+        _BYTES_BATTLEGROUNDS[battleground],
+        None if missing & _MISSING_INCOMPLETE else bool(incomplete),
+        None if missing & _MISSING_WINNER else _BYTES_TEAMS[winner],
+        draft,
+        None if missing & _MISSING_FIRSTPICK else _BYTES_TEAMS[firstpick],
+    )
+
+
+class _LazyField:
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        if self.name not in instance.__dict__:
+            instance._load()
+        return instance.__dict__[self.name]
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = value
+
+
+class LazyReplay(Replay):
+    """
+    Replay whose tracker-derived fields are decoded on first access. load_tracker is
+    called once and returns them as a dict. Pickling loads them and gives a Replay.
+    """
+
+    duration = _LazyField()
+    incomplete = _LazyField()
+    winner = _LazyField()
+    draft = _LazyField()
+    firstpick = _LazyField()
+
+    def __init__(
+        self,
+        replay_id: str,
+        version: Version,
+        gamemode: Gamemode,
+        date: datetime,
+        players: tuple[tuple[Player, ...], tuple[Player, ...]],
+        heroes: tuple[tuple[Hero, ...], tuple[Hero, ...]],
+        battleground: Battleground,
+        load_tracker,
+    ):
+        self.id: str = replay_id
+        self.version: Version = version
+        self.gamemode: Gamemode = gamemode
+        self.date = date
+        self.players: tuple[tuple[Player, ...], tuple[Player, ...]] = players
+        self.heroes: tuple[tuple[Hero, ...], tuple[Hero, ...]] = heroes
+        self.battleground: Battleground = battleground
+        self._load_tracker = load_tracker
+
+    def _load(self):
+        for name, value in self._load_tracker().items():
+            setattr(self, name, value)
+        self._load_tracker = None
+
+    def __reduce__(self):
+        return (
+            Replay,
+            (
+                self.id,
+                self.version,
+                self.gamemode,
+                self.duration,
+                self.date,
+                self.players,
+                self.heroes,
+                self.battleground,
+                self.incomplete,
+                self.winner,
+                self.draft,
+                self.firstpick,
+            ),
+        )
+
+
+class ReplayInfo:
+    def __init__(
+        self,
+        replay_id: str,
+        version: Version,
+        gamemode: Gamemode,
+        battleground: Battleground,
+        date: datetime,
+    ):
+        self.id: str = replay_id
+        self.version: Version = version
+        self.gamemode: Gamemode = gamemode
+        self.battleground: Battleground = battleground
+        self.date: datetime = date
+
+    def __str__(self):
+        return str(
+            {
+                "Version": str(self.version),
+                "Gamemode": str(self.gamemode),
+                "Date": str(self.date),
+                "Battleground": str(self.battleground),
+            }
+        )
@@ -1,20 +1,384 @@
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from functools import lru_cache
 import hashlib
+import os
 from heroprotocol.versions import protocol96370
-import mpyq
 
+from .archive import open_archive
+from .replay_ids import ReplayIdIndex
 from .model import (
+    Battleground,
     DraftAction,
     DraftActionType,
+    LazyReplay,
     Player,
     Replay,
+    ReplayInfo,
     Team,
     Version,
 )
+from .tracker import decode_tracker_events
 from .util import *
 
+# The tracker events (and the values of their first distinguishing field) that
+# _parse_tracker_events looks at. Everything else is skipped while decoding.
+_TRACKER_EVENT_FILTERS = {
+    "NNet.Replay.Tracker.SStatGameEvent": (
+        "m_eventName",
+        {b"PlayerInit", b"EndOfGameTalentChoices"},
+    ),
+    "NNet.Replay.Tracker.SHeroBannedEvent": None,
+    "NNet.Replay.Tracker.SHeroPickedEvent": None,
+    "NNet.Replay.Tracker.SUnitBornEvent": (
+        "m_unitTypeName",
+        {b"KingsCore", b"VanndarStormpike", b"DrekThar"},
+    ),
+    "NNet.Replay.Tracker.SUnitDiedEvent": None,
+}
+
+# Bans and picks are at the start of the tracker events, before the GameStart event
+_DRAFT_EVENT_FILTERS = {
+    "NNet.Replay.Tracker.SStatGameEvent": ("m_eventName", {b"GameStart"}),
+    "NNet.Replay.Tracker.SHeroBannedEvent": None,
+    "NNet.Replay.Tracker.SHeroPickedEvent": None,
+}
+
+
+def parse_replay(
+    filepath,
+    gamemode_filter=None,
+    known_replay_ids=(),
+    mode="full",
+    cache=None,
+    lazy=False,
+    replay_filter=None,
+    profile=None,
+    prefetch=False,
+) -> Replay:
+    """
+    mode="full" decodes the tracker events for the draft, levels and the exact game
+    length. mode="fast" never touches the tracker events: the winner comes from the
+    details and the duration from the header, and draft and firstpick are left empty.
+    mode="draft" is mode="fast" plus the draft and firstpick: the tracker events are
+    only decoded until all 16 bans and picks are found or the game starts.
+
+    filepath can also be the replay itself as bytes, bytearray or memoryview, or a
+    seekable binary file object (which is left open).
+
+    replay_filter is a ReplayFilter. Its predicates are checked right after the
+    header, details and initdata are decoded. Replays it drops (None is returned),
+    like those dropped by gamemode_filter or known_replay_ids, are dropped before
+    the battlelobby and tracker events are read.
+
+    known_replay_ids can be any container of replay ids; pass a ReplayIdIndex (or a
+    set) for large ones, a list is searched linearly.
+
+    If a ReplayCache is given, replays it already holds are returned without being
+    decoded again, and newly parsed replays are added to it. Only replays read from
+    a path are cached.
+
+    With lazy=True (and mode="full") a LazyReplay is returned: the tracker events
+    are only read and decoded when duration, incomplete, winner, draft or firstpick
+    is first accessed. The archive is closed in between, so the source has to still
+    be readable at that point. Lazy replays aren't added to the cache.
+
+    A ReplayProfile passed as profile records the time spent in each stage, the
+    bytes read and decompressed per archive file and the tracker event counts.
+
+    With prefetch=True the archive files the mode needs are all decompressed at
+    once on a small shared thread pool, while the ones already available are being
+    decoded. This lowers the latency of parsing a single replay; when parsing many,
+    parse_replays already keeps every core busy.
+    """
+    if mode not in ("full", "fast", "draft"):
+        raise ValueError(f"Unknown mode: {mode}")
+    if profile is not None:
+        profile.start()
+
+    if cache is None or not isinstance(filepath, (str, os.PathLike)):
+        return _parse_replay(
+            filepath,
+            gamemode_filter,
+            known_replay_ids,
+            mode,
+            lazy,
+            replay_filter,
+            profile,
+            prefetch,
+        )
+
+    replay = cache.get(filepath, mode)
+    if profile is not None:
+        profile.lap("cache")
+    if replay is None:
+        replay = _parse_replay(
+            filepath,
+            gamemode_filter,
+            known_replay_ids,
+            mode,
+            lazy,
+            replay_filter,
+            profile,
+            prefetch,
+        )
+        if replay is not None and not lazy:
+            cache.put(filepath, replay, mode)
+        return replay
+
+    if gamemode_filter and replay.gamemode not in gamemode_filter:
+        return None
+    if replay_filter is not None and not replay_filter.matches(replay):
+        return None
+    if replay.id in known_replay_ids:
+        return None
+    return replay
+
+
+def _parse_replay(
+    filepath,
+    gamemode_filter,
+    known_replay_ids,
+    mode,
+    lazy,
+    replay_filter,
+    profile,
+    prefetch,
+):
+    archive = open_archive(filepath)
+    if prefetch:
+        filenames = ["replay.details", "replay.server.battlelobby", "replay.initData"]
+        if mode == "draft" or (mode == "full" and not lazy):
+            filenames.append("replay.tracker.events")
+        archive.prefetch(filenames, _prefetch_executor())
+    if profile is not None:
+        profile.lap("archive_open")
+    try:
+        return _parse_archive(
+            filepath,
+            archive,
+            gamemode_filter,
+            known_replay_ids,
+            mode,
+            lazy,
+            replay_filter,
+            profile,
+        )
+    finally:
+        archive.close()
+
+
+def _parse_archive(
+    filepath,
+    archive,
+    gamemode_filter,
+    known_replay_ids,
+    mode,
+    lazy,
+    replay_filter,
+    profile,
+):
+    header, version, protocol = _read_header(archive)
+    if profile is not None:
+        profile.lap("header")
+
+    if replay_filter is not None and not replay_filter.check_header(version):
+        return None
+
+    # Details
+    details = protocol.decode_replay_details(
+        _read_file(archive, "replay.details", profile)
+    )
+    date = get_date(details["m_timeUTC"])
+    players = _get_players(details)
+    if profile is not None:
+        profile.lap("details")
+
+    if replay_filter is not None:
+        # Unknown battlegrounds only raise once the replay passed every filter
+        battleground = None
+        if replay_filter.battlegrounds:
+            try:
+                battleground = _get_battleground(details)
+            except NotImplementedError:
+                return None
+        if not replay_filter.check_details(
+            date,
+            battleground,
+            players.keys(),
+            [player["hero"] for player in players.values()],
+        ):
+            return None
+
+    # Initdata
+    initdata = protocol.decode_replay_initdata(
+        _read_file(archive, "replay.initData", profile)
+    )
+    gamemode = _get_gamemode(initdata)
+    if profile is not None:
+        profile.lap("initdata")
+
+    if gamemode_filter and gamemode not in gamemode_filter:
+        return None
+    if replay_filter is not None and not replay_filter.check_initdata(gamemode):
+        return None
+
+    replay_id = _get_replay_id(details, initdata)
+
+    if replay_id in known_replay_ids:
+        return None
+
+    battleground = _get_battleground(details)
 
-def parse_replay(filepath, gamemode_filter=None, known_replay_ids=[]) -> Replay:
-    archive = mpyq.MPQArchive(filepath)
+    # Battlelobby (for battletags)
+    _set_battletags(players, _read_file(archive, "replay.server.battlelobby", profile))
+    if profile is not None:
+        profile.lap("battlelobby")
+
+    if mode in ("fast", "draft"):
+        # m_result: 1 is a victory, 2 a defeat
+        for player in players.values():
+            player["win"] = player["result"] == 1
+        winner = _get_winner(players)
+        draft = firstpick = None
+        if mode == "draft":
+            draft, firstpick = _parse_draft_events(
+                protocol,
+                _read_file(archive, "replay.tracker.events", profile),
+                players,
+                profile.events if profile is not None else None,
+            )
+            if profile is not None:
+                profile.lap("tracker")
+        replay = _build_replay(
+            replay_id,
+            version,
+            gamemode,
+            get_seconds(header["m_elapsedGameLoops"]),
+            date,
+            players,
+            battleground,
+            winner is None,
+            winner,
+            draft,
+            firstpick,
+        )
+        if profile is not None:
+            profile.lap("model_build")
+        return replay
+
+    if lazy:
+
+        def load_tracker():
+            if profile is not None:
+                profile.start()
+            archive = open_archive(filepath)
+            try:
+                contents = _read_file(archive, "replay.tracker.events", profile)
+            finally:
+                archive.close()
+            tracker_fields = _get_tracker_fields(
+                protocol,
+                contents,
+                players,
+                profile.events if profile is not None else None,
+            )
+            if profile is not None:
+                profile.lap("tracker")
+            return tracker_fields
+
+        player_models, hero_models = _build_player_models(players)
+        if profile is not None:
+            profile.lap("model_build")
+        return LazyReplay(
+            replay_id,
+            version,
+            gamemode,
+            date,
+            player_models,
+            hero_models,
+            battleground,
+            load_tracker,
+        )
+
+    # Trackerevents
+    tracker_fields = _get_tracker_fields(
+        protocol,
+        _read_file(archive, "replay.tracker.events", profile),
+        players,
+        profile.events if profile is not None else None,
+    )
+    if profile is not None:
+        profile.lap("tracker")
+
+    replay = _build_replay(
+        replay_id,
+        version,
+        gamemode,
+        tracker_fields["duration"],
+        date,
+        players,
+        battleground,
+        tracker_fields["incomplete"],
+        tracker_fields["winner"],
+        tracker_fields["draft"],
+        tracker_fields["firstpick"],
+    )
+    if profile is not None:
+        profile.lap("model_build")
+    return replay
+
+
+@lru_cache(maxsize=None)
+def _prefetch_executor():
+    # Threads that decompress batches of sectors (see MappedArchive.prefetch)
+    return ThreadPoolExecutor(4, thread_name_prefix="nicer-replay-parsing")
+
+
+# A forked child (e.g. a ProcessPoolExecutor worker) would inherit the pool without
+# its threads, so children start their own
+os.register_at_fork(after_in_child=_prefetch_executor.cache_clear)
+
+
+def _read_file(archive, filename, profile):
+    if profile is None:
+        return archive.read_file(filename)
+    return profile.read_file(archive, filename)
+
+
+def probe_replay(filepath) -> ReplayInfo:
+    """
+    Cheaply identifies a replay: only the header, replay.details and replay.initData
+    are decoded, so this is suitable for deduplicating or filtering before queuing
+    replays for parse_replay. Battlegrounds parse_replay doesn't know are
+    Battleground.OTHER instead of an error.
+    """
+    archive = open_archive(filepath)
+    try:
+        header, version, protocol = _read_header(archive)
+        details = protocol.decode_replay_details(archive.read_file("replay.details"))
+        initdata = protocol.decode_replay_initdata(archive.read_file("replay.initData"))
+    finally:
+        archive.close()
+
+    try:
+        battleground = _get_battleground(details)
+    except NotImplementedError:
+        battleground = Battleground.OTHER
+    return ReplayInfo(
+        _get_replay_id(details, initdata),
+        version,
+        _get_gamemode(initdata),
+        battleground,
+        get_date(details["m_timeUTC"]),
+    )
+
+
+def _read_header(archive):
     contents = archive.header["user_data_header"]["content"]
     header = protocol96370.decode_replay_header(contents)
     version = Version(
@@ -28,19 +392,12 @@ def parse_replay(filepath, gamemode_filter=None, known_replay_ids=[]) -> Replay:
 
     protocol = import_heroprotocol(version.base_build)
     if protocol is None:
-        archive.file.close()
         raise Exception("Unsupported Build")
+    return header, version, protocol
 
-    # Battlelobby (for battletags)
-    battlelobby = archive.read_file("replay.server.battlelobby")
-
-    # Details
-    details = protocol.decode_replay_details(archive.read_file("replay.details"))
-    date = get_date(details["m_timeUTC"])
 
+def _get_players(details):
     players: dict[str, dict] = {}
-    wss_to_player = {}
-
     for player in details["m_playerList"]:
         toon_handle = f"{player['m_toon']['m_region']}-{player['m_toon']['m_programId'].decode()}-{player['m_toon']["m_realm"]}-{player['m_toon']["m_id"]}"
         if toon_handle == "0-\x00\x00\x00\x00-0-0":
@@ -54,13 +411,20 @@ def parse_replay(filepath, gamemode_filter=None, known_replay_ids=[]) -> Replay:
         except KeyError:
             hero = get_hero_from_localized(localized_name.lower())
         players[toon_handle]["hero"] = hero
-        players[toon_handle]["battletag"] = get_battletag(battlelobby, player["m_name"])
-        wss_to_player[player["m_workingSetSlotId"]] = toon_handle
+        players[toon_handle]["result"] = player["m_result"]
+    return players
 
-    # Initdata
-    initdata = protocol.decode_replay_initdata(archive.read_file("replay.initData"))
+
+def _set_battletags(players, battlelobby):
+    battletags = get_battletags(
+        battlelobby, [player["name"] for player in players.values()]
+    )
+    for player in players.values():
+        player["battletag"] = battletags.get(player["name"])
+
+
+def _get_gamemode(initdata):
     gamemode = None
-    old_replay = False
     try:
         gamemode = get_gamemode(
             initdata["m_syncLobbyState"]["m_gameDescription"]["m_gameOptions"][
@@ -69,39 +433,39 @@ def parse_replay(filepath, gamemode_filter=None, known_replay_ids=[]) -> Replay:
         )
     except KeyError:
         # Oh boy, it's a very old replay.
-        old_replay = True
         game_options = initdata["m_syncLobbyState"]["m_gameDescription"][
             "m_gameOptions"
         ]
         gamemode = get_gamemode_from_old_gameoptions(game_options)
     if gamemode == None:
         gamemode = Gamemode.OTHER
+    return gamemode
 
-    if gamemode_filter and gamemode not in gamemode_filter:
-        return None
 
+def _get_replay_id(details, initdata):
     random_value = initdata["m_syncLobbyState"]["m_gameDescription"]["m_randomValue"]
     id_string = "".join(
         sorted([str(player["m_toon"]["m_id"]) for player in details["m_playerList"]])
     )
-    replay_id = hashlib.md5((id_string + str(random_value)).encode()).hexdigest()
+    return hashlib.md5((id_string + str(random_value)).encode()).hexdigest()
 
-    if replay_id in known_replay_ids:
-        return None
 
-    # Trackerevents
-    duration = None
+def _get_battleground(details):
     try:
-        battleground = get_battleground_from_localized(details["m_title"].decode())
+        return get_battleground_from_localized(details["m_title"].decode())
     except KeyError:
         raise NotImplementedError("Unknown Battleground")
+
+
+def _parse_tracker_events(protocol, contents, players, event_counts=None):
+    duration = None
     tracker_ids_to_player: dict[int, str | None] = {}
     core_ids = []
     draft: list[DraftAction] = []
     firstpick = None
     incomplete = True
-    for event in protocol.decode_replay_tracker_events(
-        archive.read_file("replay.tracker.events")
+    for event in decode_tracker_events(
+        protocol, contents, _TRACKER_EVENT_FILTERS, event_counts
     ):
         # Tracker IDs
         if event["_eventid"] == 10 and event["m_eventName"].decode() == "PlayerInit":
@@ -115,26 +479,13 @@ def parse_replay(filepath, gamemode_filter=None, known_replay_ids=[]) -> Replay:
                     "m_stringData"
                 ][1]["m_value"].decode()
 
-        # Bans
-        if event["_event"] == "NNet.Replay.Tracker.SHeroBannedEvent":
-            team = Team.LEFT if event["m_controllingTeam"] == 1 else Team.RIGHT
-            if firstpick == None:
-                firstpick = team
-            internal_hero_name = event["m_hero"].decode()
-            hero = get_hero_from_internal(internal_hero_name)
-            draft.append(DraftAction(DraftActionType.BAN, team, hero))
-
-        # Picks
-        if event["_event"] == "NNet.Replay.Tracker.SHeroPickedEvent":
-
-            internal_hero_name = event["m_hero"].decode()
-            hero = get_hero_from_internal(internal_hero_name)
-            try:
-                team = [p for p in players.values() if p["hero"] == hero][0]["team"]
-            except IndexError:
-                # It's possible a replay got merged with a draft that isn't its own.
-                continue
-            draft.append(DraftAction(DraftActionType.PICK, team, hero))
+        # Bans and picks
+        action = _get_draft_action(event, players)
+        if action is not None:
+            if firstpick == None and action.type == DraftActionType.BAN:
+                firstpick = action.team
+            draft.append(action)
+            continue
 
         # Level, winner, completeness
         if (
@@ -172,6 +523,54 @@ def parse_replay(filepath, gamemode_filter=None, known_replay_ids=[]) -> Replay:
             last_gameloop = event["_gameloop"]
             duration = get_seconds(last_gameloop)
 
+    return duration, _check_draft(draft), firstpick, incomplete
+
+
+def _parse_draft_events(protocol, contents, players, event_counts=None):
+    draft: list[DraftAction] = []
+    firstpick = None
+    for event in decode_tracker_events(
+        protocol, contents, _DRAFT_EVENT_FILTERS, event_counts
+    ):
+        if event["_event"] == "NNet.Replay.Tracker.SStatGameEvent":
+            # GameStart, the draft is over
+            break
+        action = _get_draft_action(event, players)
+        if action is None:
+            continue
+        if firstpick == None and action.type == DraftActionType.BAN:
+            firstpick = action.team
+        draft.append(action)
+        if len(draft) == 16:
+            break
+
+    draft = _check_draft(draft)
+    return draft if len(draft) == 16 else None, firstpick
+
+
+def _get_draft_action(event, players):
+    # Bans
+    if event["_event"] == "NNet.Replay.Tracker.SHeroBannedEvent":
+        team = Team.LEFT if event["m_controllingTeam"] == 1 else Team.RIGHT
+        internal_hero_name = event["m_hero"].decode()
+        hero = get_hero_from_internal(internal_hero_name)
+        return DraftAction(DraftActionType.BAN, team, hero)
+
+    # Picks
+    if event["_event"] == "NNet.Replay.Tracker.SHeroPickedEvent":
+        internal_hero_name = event["m_hero"].decode()
+        hero = get_hero_from_internal(internal_hero_name)
+        try:
+            team = [p for p in players.values() if p["hero"] == hero][0]["team"]
+        except IndexError:
+            # It's possible a replay got merged with a draft that isn't its own.
+            return None
+        return DraftAction(DraftActionType.PICK, team, hero)
+
+    return None
+
+
+def _check_draft(draft):
     if (
         len(draft) != 16
         or len(set([a for a in draft if a.type == DraftActionType.PICK])) != 10
@@ -193,34 +592,222 @@ def parse_replay(filepath, gamemode_filter=None, known_replay_ids=[]) -> Replay:
             # There are not exactly 5 heroes on each team
             draft = []
 
-    # Building models
-    player_models = ([], [])
-    hero_models = ([], [])
-    winner = None
-    for player_id, player in players.items():
-        i = 0 if player["team"] == Team.LEFT else 1
-        player_model = Player(player_id, player["name"], player["battletag"])
-        player_models[i].append(player_model)
-        hero_models[i].append(player["hero"])
+    return draft
+
+
+def _get_tracker_fields(protocol, contents, players, event_counts=None):
+    duration, draft, firstpick, incomplete = _parse_tracker_events(
+        protocol, contents, players, event_counts
+    )
+    return {
+        "duration": duration,
+        "incomplete": incomplete,
+        "winner": _get_winner(players),
+        "draft": draft if len(draft) == 16 else None,
+        "firstpick": firstpick,
+    }
+
+
+def _get_winner(players):
+    for player in players.values():
         if "win" in player.keys() and player["win"]:
-            winner = player["team"]
+            return player["team"]
+    return None
 
+
+def _build_replay(
+    replay_id,
+    version,
+    gamemode,
+    duration,
+    date,
+    players,
+    battleground,
+    incomplete,
+    winner,
+    draft,
+    firstpick,
+):
+    player_models, hero_models = _build_player_models(players)
     return Replay(
         replay_id,
         version,
         gamemode,
         duration,
         date,
-        (tuple(player_models[0]), tuple(player_models[1])),
-        (tuple(hero_models[0]), tuple(hero_models[1])),
+        player_models,
+        hero_models,
         battleground,
         incomplete,
         winner,
-        draft if len(draft) == 16 else None,
+        draft,
         firstpick,
     )
 
 
+def _build_player_models(players):
+    player_models = ([], [])
+    hero_models = ([], [])
+    for player_id, player in players.items():
+        i = 0 if player["team"] == Team.LEFT else 1
+        player_model = Player(player_id, player["name"], player["battletag"])
+        player_models[i].append(player_model)
+        hero_models[i].append(player["hero"])
+    return (
+        (tuple(player_models[0]), tuple(player_models[1])),
+        (tuple(hero_models[0]), tuple(hero_models[1])),
+    )
+
+
+_worker_options = {}
+
+
+def _init_worker(gamemode_filter, known_replay_ids, mode, cache, replay_filter):
+    # Runs once per worker process. Importing this module already loaded heroprotocol
+    # and the util lookup tables; also load the newest protocol, which most replays
+    # (and every unknown build) resolve to.
+    import_heroprotocol(get_latest_build())
+    _worker_options["gamemode_filter"] = gamemode_filter
+    _worker_options["known_replay_ids"] = known_replay_ids
+    _worker_options["mode"] = mode
+    _worker_options["cache"] = cache
+    _worker_options["replay_filter"] = replay_filter
+
+
+def _parse_in_worker(filepath):
+    return parse_replay(filepath, **_worker_options)
+
+
+def parse_replays(
+    paths,
+    workers=None,
+    gamemode_filter=None,
+    known_replay_ids=(),
+    mode="full",
+    cache=None,
+    max_in_flight=None,
+    replay_filter=None,
+):
+    """
+    Parses replays on a pool of worker processes and yields (path, result) tuples in
+    the order they finish. result is what parse_replay returned for that path, or the
+    exception it raised. At most max_in_flight (by default four per worker) replays
+    are queued or being parsed at any time.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_in_flight or workers * 4
+    if isinstance(known_replay_ids, (list, tuple)):
+        # Sent to every worker, so make it compact and fast to search
+        known_replay_ids = ReplayIdIndex(known_replay_ids)
+    paths = iter(paths)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(gamemode_filter, known_replay_ids, mode, cache, replay_filter),
+    ) as executor:
+        pending = {}
+        while True:
+            for path in paths:
+                pending[executor.submit(_parse_in_worker, path)] = path
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                error = future.exception()
+                yield path, error if error is not None else future.result()
+
+
+def iter_replays(
+    source,
+    workers=None,
+    max_in_flight=None,
+    gamemode_filter=None,
+    known_replay_ids=(),
+    mode="full",
+    cache=None,
+    on_error=None,
+    replay_filter=None,
+):
+    """
+    Lazily parses every replay in source, a directory (searched recursively for
+    .StormReplay files) or an iterable of paths, and yields the Replay objects.
+    Replays dropped by gamemode_filter, replay_filter or known_replay_ids are skipped,
+    as are replays that fail to parse; on_error(path, exception) is called for those
+    if given.
+
+    Paths are read from source only as parsing progresses, so memory use doesn't grow
+    with the size of the corpus. workers=0 parses in this process instead of on a
+    pool of worker processes.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        source = _walk_replays(source)
+
+    if workers == 0:
+        results = _parse_in_process(
+            source, gamemode_filter, known_replay_ids, mode, cache, replay_filter
+        )
+    else:
+        results = parse_replays(
+            source,
+            workers,
+            gamemode_filter,
+            known_replay_ids,
+            mode,
+            cache,
+            max_in_flight,
+            replay_filter,
+        )
+
+    for path, result in results:
+        if isinstance(result, Exception):
+            if on_error is not None:
+                on_error(path, result)
+        elif result is not None:
+            yield result
+
+
+def _parse_in_process(
+    paths, gamemode_filter, known_replay_ids, mode, cache, replay_filter
+):
+    for path in paths:
+        try:
+            yield path, parse_replay(
+                path,
+                gamemode_filter,
+                known_replay_ids,
+                mode,
+                cache,
+                replay_filter=replay_filter,
+            )
+        except Exception as e:
+            yield path, e
+
+
+def _walk_replays(directory):
+    if os.path.isfile(directory):
+        yield directory
+        return
+    # Symlinked directories are followed, but each directory is only searched once, so
+    # symlink cycles end
+    searched = set()
+    directories = [directory]
+    while directories:
+        directory = directories.pop()
+        info = os.stat(directory)
+        if (info.st_dev, info.st_ino) in searched:
+            continue
+        searched.add((info.st_dev, info.st_ino))
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    directories.append(entry.path)
+                elif entry.name.endswith(".StormReplay"):
+                    yield entry.path
+
+
 def print_replay_contents(
     filename,
     print_details=True,
@@ -230,52 +817,41 @@ def print_replay_contents(
     print_trackerevents=True,
     print_attributeevents=True,
 ):
-    archive = mpyq.MPQArchive(filename)
-    contents = archive.header["user_data_header"]["content"]
-    header = protocol96370.decode_replay_header(contents)
-    version = Version(
-        header["m_version"]["m_baseBuild"],
-        header["m_version"]["m_major"],
-        header["m_version"]["m_minor"],
-        header["m_version"]["m_revision"],
-        header["m_version"]["m_build"],
-        header["m_version"]["m_flags"],
-    )
+    archive = open_archive(filename)
+    try:
+        header, version, protocol = _read_header(archive)
 
-    protocol = import_heroprotocol(version.base_build)
-    if protocol is None:
-        archive.file.close()
-        raise Exception("Unsupported Build")
+        if print_details:
+            contents = archive.read_file("replay.details")
+            details = protocol.decode_replay_details(contents)
+            print(details)
 
-    if print_details:
-        contents = archive.read_file("replay.details")
-        details = protocol.decode_replay_details(contents)
-        print(details)
+        if print_initdata:
+            contents = archive.read_file("replay.initData")
+            initdata = protocol.decode_replay_initdata(contents)
+            print(
+                initdata["m_syncLobbyState"]["m_gameDescription"]["m_cacheHandles"],
+            )
+            print(initdata)
 
-    if print_initdata:
-        contents = archive.read_file("replay.initData")
-        initdata = protocol.decode_replay_initdata(contents)
-        print(
-            initdata["m_syncLobbyState"]["m_gameDescription"]["m_cacheHandles"],
-        )
-        print(initdata)
-
-    if print_gameevents:
-        contents = archive.read_file("replay.game.events")
-        for event in protocol.decode_replay_game_events(contents):
-            print(event)
-
-    if print_messageevents:
-        contents = archive.read_file("replay.message.events")
-        for event in protocol.decode_replay_message_events(contents):
-            print(event)
-
-    if print_trackerevents and hasattr(protocol, "decode_replay_tracker_events"):
-        contents = archive.read_file("replay.tracker.events")
-        for event in protocol.decode_replay_tracker_events(contents):
-            print(event)
-
-    if print_attributeevents:
-        contents = archive.read_file("replay.attributes.events")
-        attributes = protocol.decode_replay_attributes_events(contents)
-        print(attributes)
+        if print_gameevents:
+            contents = archive.read_file("replay.game.events")
+            for event in protocol.decode_replay_game_events(contents):
+                print(event)
+
+        if print_messageevents:
+            contents = archive.read_file("replay.message.events")
+            for event in protocol.decode_replay_message_events(contents):
+                print(event)
+
+        if print_trackerevents and hasattr(protocol, "decode_replay_tracker_events"):
+            contents = archive.read_file("replay.tracker.events")
+            for event in protocol.decode_replay_tracker_events(contents):
+                print(event)
+
+        if print_attributeevents:
+            contents = archive.read_file("replay.attributes.events")
+            attributes = protocol.decode_replay_attributes_events(contents)
+            print(attributes)
+    finally:
+        archive.close()
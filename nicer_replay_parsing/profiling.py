@@ -0,0 +1,52 @@
+import time
+
+
+class ReplayProfile:
+    """
+    Records where parse_replay(..., profile=...) spends its time:
+
+    - stages: seconds per parsing stage (archive_open, header, details, battlelobby,
+      initdata, tracker, model_build, or cache for cache hits)
+    - files: per archive file, the archived and decompressed sizes in bytes and the
+      seconds spent reading and decompressing it
+    - events: the number of tracker events decoded, by event type
+
+    Passing the same profile to several parse_replay calls adds up their numbers.
+    Without a profile parse_replay doesn't collect any of this.
+    """
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        self.files: dict[str, dict[str, float]] = {}
+        self.events: dict[str, int] = {}
+        self._last = time.perf_counter()
+
+    def start(self):
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0) + now - self._last
+        self._last = now
+
+    def read_file(self, archive, filename):
+        start = time.perf_counter()
+        contents = archive.read_file(filename)
+        seconds = time.perf_counter() - start
+
+        file = self.files.setdefault(
+            filename, {"archived_size": 0, "size": 0, "seconds": 0}
+        )
+        hash_entry = archive.get_hash_table_entry(filename)
+        if hash_entry is not None:
+            block_entry = archive.block_table[hash_entry.block_table_index]
+            file["archived_size"] += block_entry.archived_size
+        file["size"] += len(contents) if contents is not None else 0
+        file["seconds"] += seconds
+        return contents
+
+    def to_dict(self):
+        return {"stages": self.stages, "files": self.files, "events": self.events}
+
+    def __str__(self):
+        return str(self.to_dict())
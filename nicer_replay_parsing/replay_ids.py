@@ -0,0 +1,143 @@
+from bisect import bisect_left
+from heapq import merge
+
+# Index files hold sorted digests since format 2
+_MAGIC = b"NRPIDS2\n"
+_UNSORTED_MAGIC = b"NRPIDS1\n"
+_DIGEST_SIZE = 16
+# Added ids are kept in a set until there are this many (or a sixteenth of the
+# index), then merged into the sorted digests
+_MERGE_MIN = 4096
+
+
+class ReplayIdIndex:
+    """
+    Set of replay ids stored as 16-byte md5 digests instead of 32 character hex
+    strings. Membership checks take hex ids (Replay.id) or digests, so an index can be
+    passed as known_replay_ids.
+
+    The digests are kept sorted in one bytes object and searched by bisection
+    (O(log n)), so an index costs 16 bytes per id; a set of hex ids costs about 130.
+    Ids added since the last merge are held in a small set on the side.
+    """
+
+    def __init__(self, replay_ids=()):
+        self._sorted = _SortedDigests(b"")
+        self._pending: set[bytes] = set()
+        self.update(replay_ids)
+
+    def __contains__(self, replay_id):
+        try:
+            digest = _to_digest(replay_id)
+        except ValueError:
+            return False
+        return digest in self._pending or digest in self._sorted
+
+    def __len__(self):
+        return len(self._sorted) + len(self._pending)
+
+    def __iter__(self):
+        for digest in self._sorted:
+            yield digest.hex()
+        for digest in self._pending:
+            yield digest.hex()
+
+    def __reduce__(self):
+        return (ReplayIdIndex.from_bytes, (self.to_bytes(),))
+
+    def add(self, replay_id):
+        self.update((replay_id,))
+
+    def update(self, replay_ids):
+        digests = {_to_digest(replay_id) for replay_id in replay_ids}
+        if len(self._pending) + len(digests) >= max(
+            _MERGE_MIN, len(self._sorted) // 16
+        ):
+            self._pending |= digests
+            self._merge()
+        else:
+            self._pending |= {
+                digest for digest in digests if digest not in self._sorted
+            }
+
+    def discard(self, replay_id):
+        digest = _to_digest(replay_id)
+        if digest in self._pending:
+            self._pending.discard(digest)
+        elif digest in self._sorted:
+            self._sorted = _SortedDigests(
+                b"".join(other for other in self._sorted if other != digest)
+            )
+
+    def _merge(self):
+        # Both are sorted, and ids in both are only kept once
+        data = bytearray()
+        previous = None
+        for digest in merge(self._sorted, sorted(self._pending)):
+            if digest != previous:
+                data += digest
+                previous = digest
+        self._sorted = _SortedDigests(bytes(data))
+        self._pending.clear()
+
+    def to_bytes(self) -> bytes:
+        self._merge()
+        return _MAGIC + self._sorted.data
+
+    @classmethod
+    def from_bytes(cls, data) -> "ReplayIdIndex":
+        data = memoryview(data)
+        magic = data[: len(_MAGIC)]
+        if magic != _MAGIC and magic != _UNSORTED_MAGIC:
+            raise ValueError("Not a replay id index")
+        digests = bytes(data[len(_MAGIC) :])
+        if len(digests) % _DIGEST_SIZE:
+            raise ValueError("Truncated replay id index")
+        index = cls()
+        if magic == _MAGIC:
+            index._sorted = _SortedDigests(digests)
+        else:
+            index._pending = set(_SortedDigests(digests))
+            index._merge()
+        return index
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path) -> "ReplayIdIndex":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+class _SortedDigests:
+    # A bytes object of sorted, concatenated digests, seen as a sequence of digests so
+    # that bisect can search it
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data) // _DIGEST_SIZE
+
+    def __getitem__(self, i):
+        # Only called by bisect, with 0 <= i < len(self)
+        return self.data[i * _DIGEST_SIZE : (i + 1) * _DIGEST_SIZE]
+
+    def __iter__(self):
+        data = self.data
+        for i in range(0, len(data), _DIGEST_SIZE):
+            yield data[i : i + _DIGEST_SIZE]
+
+    def __contains__(self, digest):
+        i = bisect_left(self, digest)
+        return i < len(self) and self[i] == digest
+
+
+def _to_digest(replay_id) -> bytes:
+    if isinstance(replay_id, str):
+        replay_id = bytes.fromhex(replay_id)
+    if len(replay_id) != _DIGEST_SIZE:
+        raise ValueError(f"Not a replay id: {replay_id!r}")
+    return bytes(replay_id)
@@ -0,0 +1,259 @@
+"""
+A long-lived parsing daemon on a Unix domain socket, so short-lived scripts don't pay
+for starting Python and loading heroprotocol before every replay.
+
+Every message is a frame: a 4-byte big-endian length followed by that many bytes.
+Requests are JSON, either {"path": ..., "mode": ...} or {"size": n, "mode": ...}
+followed by the n bytes of the replay itself. Responses are JSON too:
+{"status": "ok", "size": n} followed by a frame with Replay.to_bytes() (or
+"size": null if parse_replay returned None), or {"status": "error", "message": ...}.
+Clients can send any number of requests over one connection.
+
+The default socket lives in $XDG_RUNTIME_DIR or, without it, in a directory of the
+temporary directory that only its owner can access. Clients only talk to servers
+run by their own user.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import copy
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import struct
+import tempfile
+
+from .model import Replay
+from .parse_replay import _init_worker, _worker_options, parse_replay
+
+
+def default_socket_path():
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "nicer-replay-parsing.sock")
+    return os.path.join(
+        tempfile.gettempdir(),
+        f"nicer-replay-parsing-{os.getuid()}",
+        "server.sock",
+    )
+
+
+def _private_directory(socket_path):
+    # Creates the directory of the default socket, or checks that nobody else can
+    # put a socket in it
+    directory = os.path.dirname(socket_path)
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(directory)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & 0o077
+    ):
+        raise Exception(f"{directory} must be a directory only you can access")
+
+
+def serve(socket_path=None, workers=None, cache=None):
+    """
+    Serves parse requests on socket_path until interrupted (SIGINT or SIGTERM).
+    Replays are parsed on a pool of worker processes that have already loaded the
+    latest protocol; workers=0 parses on one thread of the server process instead.
+    cache is an optional ReplayCache shared by all requests.
+    """
+    if socket_path is None:
+        socket_path = default_socket_path()
+        if not os.environ.get("XDG_RUNTIME_DIR"):
+            _private_directory(socket_path)
+    _remove_stale_socket(socket_path)
+
+    if workers == 0:
+        # A single thread, which owns its cache connection
+        executor = ThreadPoolExecutor(
+            1, initializer=_init_server_worker, initargs=(cache,)
+        )
+        workers = 1
+    else:
+        workers = workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_server_worker, initargs=(cache,)
+        )
+    # Start the workers now rather than on the first request
+    for future in [executor.submit(int) for _ in range(workers)]:
+        future.result()
+
+    # Create the socket with its final permissions, instead of changing them after
+    # bind() when another user could already have connected
+    umask = os.umask(0o177)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(socket_path, _Handler)
+    finally:
+        os.umask(umask)
+    server.daemon_threads = True
+    server.executor = executor
+    signal.signal(signal.SIGTERM, _exit)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+        executor.shutdown(cancel_futures=True)
+
+
+def _exit(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _remove_stale_socket(socket_path):
+    try:
+        info = os.lstat(socket_path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(info.st_mode):
+        raise Exception(f"{socket_path} exists and is not a socket")
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(socket_path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        # Left behind by a server that didn't shut down cleanly
+        os.unlink(socket_path)
+    else:
+        raise Exception(f"A server is already listening on {socket_path}")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            request = _read_frame(self.rfile)
+            if request is None:
+                return
+            try:
+                request = json.loads(request)
+                if "path" in request:
+                    source = request["path"]
+                else:
+                    source = _read_exactly(self.rfile, request["size"])
+                replay = self._parse(source, request.get("mode", "full"))
+            except EOFError:
+                return
+            except Exception as e:
+                response = {"status": "error", "message": f"{type(e).__name__}: {e}"}
+                _write_frame(self.wfile, json.dumps(response).encode())
+                continue
+            data = replay.to_bytes() if replay is not None else None
+            response = {"status": "ok", "size": len(data) if data else None}
+            _write_frame(self.wfile, json.dumps(response).encode(), flush=not data)
+            if data:
+                _write_frame(self.wfile, data)
+
+    def _parse(self, source, mode):
+        return self.server.executor.submit(_parse_in_worker, source, mode).result()
+
+
+def _init_server_worker(cache):
+    # Every worker opens its own connection to the cache (copying a ReplayCache
+    # reopens it)
+    _init_worker(None, (), "full", copy.copy(cache), None)
+
+
+def _parse_in_worker(source, mode):
+    return parse_replay(source, mode=mode, cache=_worker_options["cache"])
+
+
+class ReplayClient:
+    """
+    Connection to a server started with serve() (or `nicer-replay-parsing serve`).
+    parse() takes the same sources as parse_replay: paths are read by the server,
+    bytes and file objects are sent over the socket. The server has to run as the
+    same user as the client.
+    """
+
+    def __init__(self, socket_path=None, timeout=None):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        try:
+            socket_path = socket_path or default_socket_path()
+            self._socket.connect(socket_path)
+            _check_server(self._socket, socket_path)
+        except BaseException:
+            self._socket.close()
+            raise
+        self._file = self._socket.makefile("rwb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def parse(self, source, mode="full") -> Replay | None:
+        payload = None
+        if isinstance(source, (str, os.PathLike)):
+            request = {"path": os.path.abspath(source), "mode": mode}
+        else:
+            if hasattr(source, "read"):
+                source.seek(0)
+                source = source.read()
+            payload = memoryview(source).cast("B")
+            request = {"size": len(payload), "mode": mode}
+        _write_frame(self._file, json.dumps(request).encode(), flush=payload is None)
+        if payload is not None:
+            self._file.write(payload)
+            self._file.flush()
+
+        response = _read_frame(self._file)
+        if response is None:
+            raise Exception("The server closed the connection")
+        response = json.loads(response)
+        if response["status"] == "error":
+            raise Exception(response["message"])
+        if response["size"] is None:
+            return None
+        data = _read_frame(self._file)
+        if data is None or len(data) != response["size"]:
+            raise Exception("The server closed the connection")
+        return Replay.from_bytes(data)
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+
+def _check_server(sock, socket_path):
+    # Only trust a server run by this user: anyone could have created the socket
+    # of a path they can write to
+    if hasattr(socket, "SO_PEERCRED"):
+        credentials = sock.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+        )
+        _, uid, _ = struct.unpack("3i", credentials)
+    else:
+        uid = os.stat(socket_path).st_uid
+    if uid != os.getuid():
+        raise Exception(f"The server on {socket_path} is run by another user")
+
+
+def _write_frame(file, data, flush=True):
+    file.write(struct.pack(">I", len(data)))
+    file.write(data)
+    if flush:
+        file.flush()
+
+
+def _read_frame(file):
+    header = file.read(4)
+    if len(header) < 4:
+        return None
+    return _read_exactly(file, struct.unpack(">I", header)[0])
+
+
+def _read_exactly(file, size):
+    data = file.read(size)
+    if len(data) < size:
+        raise EOFError("Truncated message")
+    return data
@@ -0,0 +1,352 @@
+from itertools import permutations
+
+import numpy as np
+
+from .model import (
+    _BYTES_BATTLEGROUND_CODES,
+    _BYTES_BATTLEGROUNDS,
+    _BYTES_GAMEMODE_CODES,
+    _BYTES_GAMEMODES,
+    Hero,
+)
+from .table import TEAM_SIZE, ReplayTable
+
+# Hero ids index the count arrays; 0 (padding) and UNKNOWN (-1) aren't counted
+HERO_COUNT = max(hero.id for hero in Hero) + 1
+
+GROUP_BY = ("battleground", "gamemode", "build", "date")
+_HEROES_BY_ID = {hero.id: hero for hero in Hero}
+
+# Groups are keyed by the codes of ReplayTable (those of Replay.to_bytes()), which new
+# enum members don't change, so saved counts stay valid across versions
+_SAVE_FORMAT = 1
+
+
+class _GroupedCounts:
+    # Arrays of counts with a row per group: _COUNTS maps their names to the shape
+    # of a row, and groups maps the key of every group to its row
+    _COUNTS: dict[str, tuple] = {}
+
+    def __init__(self, group_by=(), date_unit="M"):
+        for column in group_by:
+            if column not in GROUP_BY:
+                raise ValueError(f"Can't group by {column}")
+        self.group_by = tuple(group_by)
+        self.date_unit = date_unit
+        self.groups: dict[tuple, int] = {}
+        for name, shape in self._COUNTS.items():
+            setattr(self, name, np.zeros((0,) + shape, dtype=np.int64))
+
+    def save(self, path):
+        """Saves the counts to an .npz file, to load() and update() them later."""
+        np.savez(
+            path,
+            format=np.array(_SAVE_FORMAT),
+            group_by=np.array(self.group_by, dtype=str),
+            date_unit=np.array(self.date_unit),
+            keys=np.array(list(self.groups), dtype=np.int64).reshape(
+                len(self.groups), len(self.group_by)
+            ),
+            **{name: getattr(self, name) for name in self._COUNTS},
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if "format" not in data or int(data["format"]) != _SAVE_FORMAT:
+                raise ValueError(f"{path} was saved by another version, recompute it")
+            counts = cls(data["group_by"].tolist(), str(data["date_unit"]))
+            for key in data["keys"].tolist():
+                counts.groups[tuple(key)] = len(counts.groups)
+            for name in cls._COUNTS:
+                setattr(counts, name, data[name])
+        return counts
+
+    def _group_indices(self, table):
+        if not self.group_by:
+            self.groups.setdefault((), 0)
+            return np.zeros(len(table), dtype=np.intp)
+
+        columns = []
+        for column in self.group_by:
+            if column == "battleground":
+                columns.append(table.battlegrounds.astype(np.int64))
+            elif column == "gamemode":
+                columns.append(table.gamemodes.astype(np.int64))
+            elif column == "build":
+                columns.append(table.builds.astype(np.int64))
+            else:
+                buckets = table.dates.astype(f"datetime64[{self.date_unit}]")
+                columns.append(buckets.astype(np.int64))
+
+        # Number the distinct values of every column and combine the numbers into a
+        # single key per row, which is much faster to np.unique than rows of columns
+        combined = np.zeros(len(table), dtype=np.int64)
+        uniques = []
+        for column in columns:
+            values, inverse = np.unique(column, return_inverse=True)
+            combined = combined * len(values) + inverse.reshape(-1)
+            uniques.append(values)
+        keys, inverse = np.unique(combined, return_inverse=True)
+
+        # Map this table's groups onto the groups seen so far
+        indices = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys.tolist()):
+            values = []
+            for column_values in reversed(uniques):
+                key, value = divmod(key, len(column_values))
+                values.append(int(column_values[value]))
+            indices[i] = self.groups.setdefault(
+                tuple(reversed(values)), len(self.groups)
+            )
+        return indices[inverse.reshape(-1)]
+
+    def _grow(self):
+        for name, shape in self._COUNTS.items():
+            counts = getattr(self, name)
+            missing = len(self.groups) - len(counts)
+            if missing > 0:
+                extra = np.zeros((missing,) + shape, dtype=np.int64)
+                setattr(self, name, np.concatenate([counts, extra]))
+
+    def _group_index(self, group):
+        # The index of a group given like group_key returns it, or None if unseen
+        key = []
+        for column in self.group_by:
+            value = group[column]
+            if column == "battleground":
+                key.append(_BYTES_BATTLEGROUND_CODES[value])
+            elif column == "gamemode":
+                key.append(_BYTES_GAMEMODE_CODES[value])
+            elif column == "build":
+                key.append(value)
+            else:
+                key.append(int(np.datetime64(value, self.date_unit).astype(np.int64)))
+        return self.groups.get(tuple(key))
+
+    def group_key(self, key) -> dict:
+        """Turns one of the keys of groups into a dict of enums, builds and dates."""
+        result = {}
+        for column, value in zip(self.group_by, key):
+            if column == "battleground":
+                result[column] = _BYTES_BATTLEGROUNDS[value]
+            elif column == "gamemode":
+                result[column] = _BYTES_GAMEMODES[value]
+            elif column == "build":
+                result[column] = value
+            else:
+                result[column] = np.datetime64(value, self.date_unit).item()
+        return result
+
+
+class HeroStats(_GroupedCounts):
+    """
+    Per-hero pick, win and ban counts, optionally grouped by any of GROUP_BY. Dates
+    are grouped into buckets of date_unit, a NumPy datetime unit ("D", "W", "M" or
+    "Y").
+
+    Counts are accumulated with update() one ReplayTable at a time, so a corpus can
+    be streamed through in chunks. For every group, the arrays picks, wins, losses
+    and bans are indexed by Hero.id; games counts the replays of the group and
+    drafted the ones with a draft (the denominator of ban rates).
+    """
+
+    _COUNTS = {
+        "games": (),
+        "drafted": (),
+        "picks": (HERO_COUNT,),
+        "wins": (HERO_COUNT,),
+        "losses": (HERO_COUNT,),
+        "bans": (HERO_COUNT,),
+    }
+
+    def update(self, table: ReplayTable):
+        if not len(table):
+            return
+        groups = self._group_indices(table)
+        group_count = len(self.groups)
+        self._grow()
+
+        self.games += np.bincount(groups, minlength=group_count)
+        drafted = table.draft_types[:, 0] >= 0
+        self.drafted += np.bincount(groups[drafted], minlength=group_count)
+
+        heroes = table.heroes
+        rows = np.broadcast_to(groups[:, None], heroes.shape)
+        self.picks += _count(rows, heroes, heroes > 0, group_count)
+
+        # Heroes on the winning team: columns 0-4 if the left team (0) won, 5-9 if
+        # the right team (1) did
+        winning_side = np.arange(heroes.shape[1]) // TEAM_SIZE
+        decided = (table.winners >= 0)[:, None] & (heroes > 0)
+        won = winning_side[None, :] == table.winners[:, None]
+        self.wins += _count(rows, heroes, decided & won, group_count)
+        self.losses += _count(rows, heroes, decided & ~won, group_count)
+
+        draft = table.draft
+        rows = np.broadcast_to(groups[:, None], draft.shape)
+        self.bans += _count(
+            rows, draft, (table.draft_types == 0) & (draft > 0), group_count
+        )
+
+    def rows(self):
+        """
+        Yields a dict per group and hero that was picked or banned in it, with the
+        counts and the pick, win and ban rates (None when undefined).
+        """
+        for key, group in self.groups.items():
+            games = int(self.games[group])
+            drafted = int(self.drafted[group])
+            for hero_id in np.flatnonzero(self.picks[group] + self.bans[group]):
+                picks = int(self.picks[group, hero_id])
+                wins = int(self.wins[group, hero_id])
+                losses = int(self.losses[group, hero_id])
+                bans = int(self.bans[group, hero_id])
+                yield {
+                    **self.group_key(key),
+                    "hero": _HEROES_BY_ID[int(hero_id)],
+                    "games": games,
+                    "picks": picks,
+                    "wins": wins,
+                    "losses": losses,
+                    "bans": bans,
+                    "pick_rate": picks / games,
+                    "win_rate": wins / (wins + losses) if wins + losses else None,
+                    "ban_rate": bans / drafted if drafted else None,
+                }
+
+
+# Ordered pairs of positions: of two teammates, and of a hero and an opponent
+_TEAMMATES = np.array(list(permutations(range(TEAM_SIZE), 2))).T
+_OPPONENTS = np.indices((TEAM_SIZE, TEAM_SIZE)).reshape(2, -1)
+
+
+class HeroMatchups(_GroupedCounts):
+    """
+    How heroes do with and against each other in decided replays, optionally
+    grouped like HeroStats. Every group has four matrices indexed [a.id, b.id]:
+
+    - with_games, with_wins: games of a and b on the same team, and their wins
+    - against_games, against_wins: games of a against b, and the ones a won
+
+    Call update() as new replays arrive; save() and load() keep the counts between
+    runs.
+    """
+
+    _COUNTS = {
+        "with_games": (HERO_COUNT, HERO_COUNT),
+        "with_wins": (HERO_COUNT, HERO_COUNT),
+        "against_games": (HERO_COUNT, HERO_COUNT),
+        "against_wins": (HERO_COUNT, HERO_COUNT),
+    }
+
+    def update(self, table: ReplayTable):
+        table = table[table.winners >= 0]
+        if not len(table):
+            return
+        groups = self._group_indices(table)
+        group_count = len(self.groups)
+        self._grow()
+
+        left = table.heroes[:, :TEAM_SIZE]
+        right = table.heroes[:, TEAM_SIZE:]
+        left_won = table.winners == 0
+        sides = ((left, right, left_won), (right, left, ~left_won))
+        for team, opponents, won in sides:
+            for prefix, others, pairs in (
+                ("with", team, _TEAMMATES),
+                ("against", opponents, _OPPONENTS),
+            ):
+                a = team[:, pairs[0]]
+                b = others[:, pairs[1]]
+                rows = np.broadcast_to(groups[:, None], a.shape)
+                played = (a > 0) & (b > 0)
+                games = getattr(self, f"{prefix}_games")
+                wins = getattr(self, f"{prefix}_wins")
+                games += _count_pairs(rows, a, b, played, group_count)
+                wins += _count_pairs(rows, a, b, played & won[:, None], group_count)
+
+    def synergy(self, **group) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The win rates (NaN without games) and numbers of games of heroes on the same
+        team in a group, e.g. synergy(battleground=Battleground.CURSED_HOLLOW) when
+        grouped by battleground.
+        """
+        return self._rates("with", group)
+
+    def counters(self, **group) -> tuple[np.ndarray, np.ndarray]:
+        """Like synergy(), the win rates and games of a against b."""
+        return self._rates("against", group)
+
+    def _rates(self, prefix, group):
+        index = self._group_index(group)
+        if index is None:
+            games = wins = np.zeros((HERO_COUNT, HERO_COUNT), dtype=np.int64)
+        else:
+            games = getattr(self, f"{prefix}_games")[index]
+            wins = getattr(self, f"{prefix}_wins")[index]
+        rates = np.full(games.shape, np.nan)
+        np.divide(wins, games, out=rates, where=games > 0)
+        return rates, games
+
+
+def _count(rows, heroes, mask, group_count):
+    counts = np.bincount(
+        rows[mask] * HERO_COUNT + heroes[mask], minlength=group_count * HERO_COUNT
+    )
+    return counts.reshape(group_count, HERO_COUNT)
+
+
+def _count_pairs(rows, a, b, mask, group_count):
+    counts = np.bincount(
+        (rows[mask] * HERO_COUNT + a[mask]) * HERO_COUNT + b[mask],
+        minlength=group_count * HERO_COUNT * HERO_COUNT,
+    )
+    return counts.reshape(group_count, HERO_COUNT, HERO_COUNT)
+
+
+def hero_stats(source, group_by=(), date_unit="M", chunk_size=100_000) -> HeroStats:
+    """
+    Computes HeroStats for a ReplayTable, an iterable of ReplayTables or an iterable
+    of Replays. Replays are turned into tables chunk_size at a time, so the corpus
+    doesn't have to fit in memory (e.g. pass iter_replays(directory)).
+    """
+    stats = HeroStats(group_by, date_unit)
+    for table in _tables(source, chunk_size):
+        stats.update(table)
+    return stats
+
+
+def hero_matchups(
+    source, group_by=(), date_unit="M", chunk_size=100_000, matchups=None
+) -> HeroMatchups:
+    """
+    Computes HeroMatchups for the same sources as hero_stats. To add new replays to
+    the matchups of an earlier run, pass those as matchups.
+    """
+    if matchups is None:
+        matchups = HeroMatchups(group_by, date_unit)
+    for table in _tables(source, chunk_size):
+        matchups.update(table)
+    return matchups
+
+
+def _tables(source, chunk_size):
+    if isinstance(source, ReplayTable):
+        yield source
+        return
+    # Tables are counted as they come; only replays are gathered into chunks
+    chunk = []
+    for item in source:
+        if isinstance(item, ReplayTable):
+            if chunk:
+                yield ReplayTable.from_replays(chunk)
+                chunk = []
+            yield item
+        else:
+            chunk.append(item)
+            if len(chunk) == chunk_size:
+                yield ReplayTable.from_replays(chunk)
+                chunk = []
+    if chunk:
+        yield ReplayTable.from_replays(chunk)
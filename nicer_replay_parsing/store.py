@@ -0,0 +1,289 @@
+from itertools import islice
+import os
+
+import numpy as np
+
+from .model import (
+    _BYTES_BATTLEGROUND_CODES,
+    _BYTES_BATTLEGROUNDS,
+    _BYTES_DRAFT_ACTION_TYPE_CODES,
+    _BYTES_DRAFT_ACTION_TYPES,
+    _BYTES_GAMEMODE_CODES,
+    _BYTES_GAMEMODES,
+    _BYTES_TEAM_CODES,
+    _BYTES_TEAMS,
+    _decode_players,
+    _encode_players,
+    DraftAction,
+    Hero,
+    Replay,
+    Version,
+)
+from .table import DRAFT_SIZE, TEAM_SIZE, ReplayTable
+
+# Enums are coded like in Replay.to_bytes(), heroes by Hero.id like in ReplayTable.
+# -1 stands for None in flags, incomplete, winner, firstpick and the draft codes, NaN
+# in duration. Replays without a draft have -1 draft codes (and 0 heroes).
+RECORD = np.dtype(
+    [
+        ("id", "V16"),
+        ("date", "<M8[us]"),
+        ("duration", "<f8"),
+        ("players_offset", "<u8"),
+        ("flags", "<i8"),
+        ("base_build", "<u4"),
+        ("build", "<u4"),
+        ("players_size", "<u4"),
+        ("major", "<u2"),
+        ("minor", "<u2"),
+        ("revision", "<u2"),
+        ("heroes", "<i2", (2 * TEAM_SIZE,)),
+        ("draft", "<i2", (DRAFT_SIZE,)),
+        ("draft_teams", "i1", (DRAFT_SIZE,)),
+        ("draft_types", "i1", (DRAFT_SIZE,)),
+        ("gamemode", "u1"),
+        ("battleground", "u1"),
+        ("winner", "i1"),
+        ("firstpick", "i1"),
+        ("incomplete", "i1"),
+        ("player_counts", "u1", (2,)),
+    ]
+)
+
+_MAGIC = b"NRPREC1\n"
+_HEROES_BY_ID = {hero.id: hero for hero in Hero}
+_HEROES_BY_ID[0] = None
+_NO_DRAFT = ([0] * DRAFT_SIZE, [-1] * DRAFT_SIZE, [-1] * DRAFT_SIZE)
+
+
+class ReplayStore:
+    """
+    An append-only file of fixed-width replay records (see RECORD), with the players
+    in a heap of strings next to it (path + ".strings"). records maps the file as a
+    NumPy structured array, so scans over millions of replays need neither parsing
+    nor deserialization, and store[i] rebuilds the i-th Replay in O(1).
+
+        store = ReplayStore("replays.rec")
+        store.extend(iter_replays(directory))
+        cursed = store.records["battleground"] == store.battleground_code(
+            Battleground.CURSED_HOLLOW
+        )
+
+    Records are written after their players, so a store that was interrupted while
+    appending is still readable. Drafts must be complete (16 actions) like in
+    ReplayTable; an empty draft is stored like a missing one.
+    """
+
+    def __init__(self, path, batch_size=10_000):
+        self.path = path
+        self.batch_size = batch_size
+        self._strings_path = f"{path}.strings"
+        with open(path, "ab+") as f:
+            if f.tell() == 0:
+                f.write(_MAGIC)
+            f.seek(0)
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{path} is not a replay store")
+        open(self._strings_path, "ab").close()
+        self._records = None
+        self._strings = None
+
+    def __reduce__(self):
+        return (ReplayStore, (self.path, self.batch_size))
+
+    def __len__(self):
+        return (os.path.getsize(self.path) - len(_MAGIC)) // RECORD.itemsize
+
+    @property
+    def records(self) -> np.ndarray:
+        """All records as a read-only, memory-mapped structured array."""
+        count = len(self)
+        if self._records is None or len(self._records) != count:
+            if count == 0:
+                self._records = np.zeros(0, dtype=RECORD)
+            else:
+                self._records = np.memmap(
+                    self.path, RECORD, "r", offset=len(_MAGIC), shape=(count,)
+                )
+        return self._records
+
+    def __getitem__(self, index) -> Replay:
+        record = self.records[index]
+        return self._replay(record.item())
+
+    def __iter__(self):
+        for record in self.records:
+            yield self._replay(record.item())
+
+    def _replay(self, record):
+        (
+            digest,
+            date,
+            duration,
+            players_offset,
+            flags,
+            base_build,
+            build,
+            players_size,
+            major,
+            minor,
+            revision,
+            heroes,
+            draft,
+            draft_teams,
+            draft_types,
+            gamemode,
+            battleground,
+            winner,
+            firstpick,
+            incomplete,
+            player_counts,
+        ) = record
+        strings = self._strings
+        if strings is None or len(strings) < players_offset + players_size:
+            strings = self._strings = np.memmap(self._strings_path, np.uint8, "r")
+        players, _ = _decode_players(
+            memoryview(strings[players_offset : players_offset + players_size]),
+            0,
+            player_counts.tolist(),
+        )
+        heroes = heroes.tolist()
+        if draft_types[0] < 0:
+            actions = None
+        else:
+            actions = [
+                DraftAction(
+                    _BYTES_DRAFT_ACTION_TYPES[action_type],
+                    _BYTES_TEAMS[team],
+                    _HEROES_BY_ID[hero],
+                )
+                for hero, team, action_type in zip(
+                    draft.tolist(), draft_teams.tolist(), draft_types.tolist()
+                )
+            ]
+        return Replay(
+            bytes(digest).hex(),
+            Version(
+                base_build, major, minor, revision, build, None if flags < 0 else flags
+            ),
+            _BYTES_GAMEMODES[gamemode],
+            None if duration != duration else duration,
+            date,
+            players,
+            tuple(
+                tuple(_HEROES_BY_ID[hero] for hero in team if hero)
+                for team in (heroes[:TEAM_SIZE], heroes[TEAM_SIZE:])
+            ),
+            _BYTES_BATTLEGROUNDS[battleground],
+            None if incomplete < 0 else bool(incomplete),
+            None if winner < 0 else _BYTES_TEAMS[winner],
+            actions,
+            None if firstpick < 0 else _BYTES_TEAMS[firstpick],
+        )
+
+    def append(self, replay: Replay):
+        self.extend([replay])
+
+    def extend(self, replays) -> int:
+        """
+        Appends replays from any iterable (e.g. iter_replays(...)), writing
+        batch_size at a time. Returns how many were appended.
+        """
+        count = 0
+        replays = iter(replays)
+        while batch := list(islice(replays, self.batch_size)):
+            self._write(batch)
+            count += len(batch)
+        return count
+
+    def _write(self, replays):
+        rows = []
+        parts = []
+        with open(self._strings_path, "ab") as strings:
+            offset = strings.tell()
+            for replay in replays:
+                players = []
+                _encode_players(replay.players, players)
+                players = b"".join(players)
+                parts.append(players)
+                rows.append(_record(replay, offset, len(players)))
+                offset += len(players)
+            strings.write(b"".join(parts))
+        records = np.array(rows, dtype=RECORD)
+        with open(self.path, "ab") as f:
+            # Drop a record left half-written by an interrupted append
+            f.truncate(len(_MAGIC) + len(self) * RECORD.itemsize)
+            f.write(records.tobytes())
+
+    def table(self, rows=slice(None)) -> ReplayTable:
+        """The records (or some rows of them) as a ReplayTable."""
+        records = self.records[rows]
+        return ReplayTable(
+            records["id"],
+            records["base_build"],
+            records["gamemode"],
+            records["battleground"],
+            records["date"].astype("datetime64[ms]"),
+            records["duration"],
+            records["heroes"],
+            records["winner"],
+            records["firstpick"],
+            records["incomplete"] == 1,
+            records["draft"],
+            records["draft_teams"],
+            records["draft_types"],
+        )
+
+    @staticmethod
+    def gamemode_code(gamemode) -> int:
+        return _BYTES_GAMEMODE_CODES[gamemode]
+
+    @staticmethod
+    def battleground_code(battleground) -> int:
+        return _BYTES_BATTLEGROUND_CODES[battleground]
+
+    def close(self):
+        self._records = None
+        self._strings = None
+
+
+def _record(replay, players_offset, players_size):
+    version = replay.version
+    heroes = []
+    for team in replay.heroes:
+        if len(team) > TEAM_SIZE:
+            raise ValueError(f"Replay {replay.id} has a team of {len(team)}")
+        heroes += [hero.id for hero in team]
+        heroes += [0] * (TEAM_SIZE - len(team))
+    actions = replay.draft
+    if actions and len(actions) != DRAFT_SIZE:
+        raise ValueError(f"Replay {replay.id} has {len(actions)} draft actions")
+    if actions:
+        draft = (
+            [action.hero.id if action.hero else 0 for action in actions],
+            [_BYTES_TEAM_CODES[action.team] for action in actions],
+            [_BYTES_DRAFT_ACTION_TYPE_CODES[action.type] for action in actions],
+        )
+    else:
+        draft = _NO_DRAFT
+    return (
+        bytes.fromhex(replay.id),
+        replay.date,
+        replay.duration if replay.duration is not None else np.nan,
+        players_offset,
+        version.flags if version.flags is not None else -1,
+        version.base_build,
+        version.build,
+        players_size,
+        version.major,
+        version.minor,
+        version.revision,
+        heroes,
+        *draft,
+        _BYTES_GAMEMODE_CODES[replay.gamemode],
+        _BYTES_BATTLEGROUND_CODES[replay.battleground],
+        _BYTES_TEAM_CODES.get(replay.winner, -1),
+        _BYTES_TEAM_CODES.get(replay.firstpick, -1),
+        int(replay.incomplete) if replay.incomplete is not None else -1,
+        [len(team) for team in replay.players],
+    )
@@ -0,0 +1,237 @@
+from array import array
+import numbers
+
+import numpy as np
+
+from .model import (
+    _BYTES_BATTLEGROUND_CODES,
+    _BYTES_BATTLEGROUNDS,
+    _BYTES_GAMEMODE_CODES,
+    _BYTES_GAMEMODES,
+    DraftActionType,
+    Hero,
+    Team,
+)
+
+TEAM_SIZE = 5
+DRAFT_SIZE = 16
+
+_DIGEST = np.dtype("V16")
+_TEAM_CODES = {Team.LEFT: 0, Team.RIGHT: 1, None: -1}
+_DRAFT_TYPE_CODES = {DraftActionType.BAN: 0, DraftActionType.PICK: 1}
+
+
+class ReplayTable:
+    """
+    A corpus of replays stored column-wise in NumPy arrays, one row per replay:
+
+    - digests: replay ids as 16-byte digests (ids converts them to hex strings)
+    - builds: base builds
+    - gamemodes, battlegrounds: codes, the index into GAMEMODES / BATTLEGROUNDS.
+      These are the codes of Replay.to_bytes(), which new enum members don't change.
+    - dates: datetime64[ms]
+    - durations: in seconds, NaN if unknown
+    - heroes: hero ids, shape (N, 10). Columns 0-4 are the left team and 5-9 the
+      right team; 0 pads teams with fewer than five heroes.
+    - winners, firstpicks: 0 for Team.LEFT, 1 for Team.RIGHT, -1 if unknown
+    - incomplete: bool
+    - draft: hero ids in draft order, shape (N, 16), with draft_teams (coded like
+      winners) and draft_types (0 for bans, 1 for picks) of the same shape. Rows of
+      replays without a draft are 0 in draft and -1 in the other two.
+
+    Indexing with a boolean mask, an array of indices or a slice returns a new table
+    with those rows.
+    """
+
+    COLUMNS = (
+        "digests",
+        "builds",
+        "gamemodes",
+        "battlegrounds",
+        "dates",
+        "durations",
+        "heroes",
+        "winners",
+        "firstpicks",
+        "incomplete",
+        "draft",
+        "draft_teams",
+        "draft_types",
+    )
+    GAMEMODES = _BYTES_GAMEMODES
+    BATTLEGROUNDS = _BYTES_BATTLEGROUNDS
+
+    def __init__(
+        self,
+        ids,
+        builds,
+        gamemodes,
+        battlegrounds,
+        dates,
+        durations,
+        heroes,
+        winners,
+        firstpicks,
+        incomplete,
+        draft,
+        draft_teams,
+        draft_types,
+    ):
+        self.digests: np.ndarray = _to_digests(ids)
+        self.builds: np.ndarray = np.asarray(builds, dtype=np.int32)
+        self.gamemodes: np.ndarray = np.asarray(gamemodes, dtype=np.int8)
+        self.battlegrounds: np.ndarray = np.asarray(battlegrounds, dtype=np.int8)
+        self.dates: np.ndarray = np.asarray(dates, dtype="datetime64[ms]")
+        self.durations: np.ndarray = np.asarray(durations, dtype=np.float64)
+        self.heroes: np.ndarray = np.asarray(heroes, dtype=np.int16).reshape(
+            -1, 2 * TEAM_SIZE
+        )
+        self.winners: np.ndarray = np.asarray(winners, dtype=np.int8)
+        self.firstpicks: np.ndarray = np.asarray(firstpicks, dtype=np.int8)
+        self.incomplete: np.ndarray = np.asarray(incomplete, dtype=bool)
+        self.draft: np.ndarray = np.asarray(draft, dtype=np.int16).reshape(
+            -1, DRAFT_SIZE
+        )
+        self.draft_teams: np.ndarray = np.asarray(draft_teams, dtype=np.int8).reshape(
+            -1, DRAFT_SIZE
+        )
+        self.draft_types: np.ndarray = np.asarray(draft_types, dtype=np.int8).reshape(
+            -1, DRAFT_SIZE
+        )
+        for column in self.COLUMNS:
+            if len(getattr(self, column)) != len(self):
+                raise ValueError(f"Column {column} doesn't have {len(self)} rows")
+
+    @classmethod
+    def from_replays(cls, replays) -> "ReplayTable":
+        """Builds a table from an iterable of Replays (or CompactReplays)."""
+        ids = []
+        dates = []
+        builds = array("i")
+        gamemodes = array("b")
+        battlegrounds = array("b")
+        durations = array("d")
+        heroes = array("h")
+        winners = array("b")
+        firstpicks = array("b")
+        incomplete = array("b")
+        draft = array("h")
+        draft_teams = array("b")
+        draft_types = array("b")
+
+        no_draft = [0] * DRAFT_SIZE
+        no_draft_codes = [-1] * DRAFT_SIZE
+        for replay in replays:
+            ids.append(bytes.fromhex(replay.id))
+            dates.append(replay.date)
+            builds.append(replay.version.base_build)
+            gamemodes.append(_BYTES_GAMEMODE_CODES[replay.gamemode])
+            battlegrounds.append(_BYTES_BATTLEGROUND_CODES[replay.battleground])
+            durations.append(
+                replay.duration if replay.duration is not None else float("nan")
+            )
+            for team in replay.heroes:
+                if len(team) > TEAM_SIZE:
+                    raise ValueError(f"Replay {replay.id} has a team of {len(team)}")
+                heroes.extend(hero.id for hero in team)
+                heroes.extend([0] * (TEAM_SIZE - len(team)))
+            winners.append(_TEAM_CODES[replay.winner])
+            firstpicks.append(_TEAM_CODES[replay.firstpick])
+            incomplete.append(bool(replay.incomplete))
+            actions = replay.draft
+            if actions and len(actions) != DRAFT_SIZE:
+                raise ValueError(f"Replay {replay.id} has {len(actions)} draft actions")
+            if actions:
+                draft.extend(action.hero.id if action.hero else 0 for action in actions)
+                draft_teams.extend(_TEAM_CODES[action.team] for action in actions)
+                draft_types.extend(_DRAFT_TYPE_CODES[action.type] for action in actions)
+            else:
+                draft.extend(no_draft)
+                draft_teams.extend(no_draft_codes)
+                draft_types.extend(no_draft_codes)
+
+        return cls(
+            ids,
+            builds,
+            gamemodes,
+            battlegrounds,
+            np.array(dates, dtype="datetime64[ms]"),
+            durations,
+            heroes,
+            winners,
+            firstpicks,
+            incomplete,
+            draft,
+            draft_teams,
+            draft_types,
+        )
+
+    @classmethod
+    def concatenate(cls, tables) -> "ReplayTable":
+        tables = list(tables)
+        return cls(
+            *(
+                np.concatenate([getattr(table, column) for table in tables])
+                for column in cls.COLUMNS
+            )
+        )
+
+    def __len__(self):
+        return len(self.digests)
+
+    @property
+    def ids(self) -> np.ndarray:
+        """The replay ids as hex strings, like Replay.id."""
+        return np.array([digest.hex() for digest in self.digests.tolist()], dtype=str)
+
+    def __getitem__(self, rows) -> "ReplayTable":
+        if isinstance(rows, numbers.Integral):
+            # Also NumPy integers, e.g. from np.flatnonzero(mask)
+            rows = slice(rows, rows + 1 or None)
+        return ReplayTable(*(getattr(self, column)[rows] for column in self.COLUMNS))
+
+    def mask(self, replay_filter) -> np.ndarray:
+        """
+        Evaluates a ReplayFilter on every row at once and returns a boolean mask.
+        Tables don't store players, so filtering by toon handle isn't supported.
+        """
+        if replay_filter.toon_handles:
+            raise ValueError("ReplayTable doesn't store players")
+        mask = np.ones(len(self), dtype=bool)
+        if replay_filter.min_build is not None:
+            mask &= self.builds >= replay_filter.min_build
+        if replay_filter.max_build is not None:
+            mask &= self.builds <= replay_filter.max_build
+        if replay_filter.after is not None:
+            mask &= self.dates >= np.datetime64(replay_filter.after, "ms")
+        if replay_filter.before is not None:
+            mask &= self.dates <= np.datetime64(replay_filter.before, "ms")
+        if replay_filter.battlegrounds:
+            codes = [_BYTES_BATTLEGROUND_CODES[b] for b in replay_filter.battlegrounds]
+            mask &= np.isin(self.battlegrounds, codes)
+        if replay_filter.gamemodes:
+            codes = [_BYTES_GAMEMODE_CODES[g] for g in replay_filter.gamemodes]
+            mask &= np.isin(self.gamemodes, codes)
+        if replay_filter.heroes:
+            ids = [hero.id for hero in replay_filter.heroes]
+            mask &= np.isin(self.heroes, ids).any(axis=1)
+        return mask
+
+    def has_hero(self, hero: Hero, team: Team | None = None) -> np.ndarray:
+        """Boolean mask of the replays in which hero was played (by team)."""
+        if team is None:
+            heroes = self.heroes
+        else:
+            start = _TEAM_CODES[team] * TEAM_SIZE
+            heroes = self.heroes[:, start : start + TEAM_SIZE]
+        return (heroes == hero.id).any(axis=1)
+
+
+def _to_digests(ids):
+    # Replay ids as hex strings or 16-byte digests
+    if isinstance(ids, np.ndarray) and ids.dtype == _DIGEST:
+        return ids
+    return np.array(
+        [bytes.fromhex(i) if isinstance(i, str) else bytes(i) for i in ids],
+        dtype=_DIGEST,
+    ).reshape(-1)
@@ -0,0 +1,263 @@
+import struct
+
+from heroprotocol.decoders import CorruptedError, TruncatedError
+
+
+def decode_tracker_events(protocol, contents, event_filters, event_counts=None):
+    """
+    Decodes replay.tracker.events like protocol.decode_replay_tracker_events, but
+    only builds and yields the events named in event_filters. Everything else is
+    skipped in the bitstream without creating Python objects for it.
+
+    event_filters maps an event name (e.g. "NNet.Replay.Tracker.SHeroPickedEvent") to
+    None, to yield every such event, or to a (field, values) tuple, to only yield the
+    events whose field is one of values. Decoding an event stops as soon as the field
+    shows it isn't wanted.
+
+    If event_counts is a dict, the number of events read (wanted or skipped) is
+    added to it by event name.
+    """
+    wanted = {}
+    for eventid, (typeid, name) in protocol.tracker_event_types.items():
+        if name in event_filters:
+            wanted[eventid] = (typeid, name, event_filters[name])
+
+    decoder = _TrackerDecoder(contents, protocol.typeinfos)
+    try:
+        yield from decoder.events(
+            protocol.svaruint32_typeid,
+            protocol.tracker_eventid_typeid,
+            protocol.tracker_event_types,
+            wanted,
+            event_counts,
+        )
+    except IndexError:
+        raise TruncatedError(decoder)
+
+
+class _TrackerDecoder:
+    # Reads the same format as heroprotocol's VersionedDecoder. Tracker events only use
+    # whole bytes, so the stream is read with a byte offset instead of a bit buffer.
+
+    def __init__(self, contents, typeinfos):
+        self._data = contents
+        self._used = 0
+        self._typeinfos = typeinfos
+        self._fields = {}
+
+    def __str__(self):
+        return f"buffer([{self._used}])"
+
+    def events(
+        self, svaruint32_typeid, eventid_typeid, event_types, wanted, event_counts
+    ):
+        data = self._data
+        gameloop = 0
+        while self._used < len(data):
+            start = self._used
+
+            # decode the gameloop delta before each event
+            for delta in self.instance(svaruint32_typeid).values():
+                gameloop += delta
+
+            eventid = self.instance(eventid_typeid)
+            if event_counts is not None and eventid in event_types:
+                name = event_types[eventid][1]
+                event_counts[name] = event_counts.get(name, 0) + 1
+            if eventid not in wanted:
+                if eventid not in event_types:
+                    raise CorruptedError(f"eventid({eventid}) at {self}")
+                self._skip_instance()
+                continue
+
+            typeid, typename, event_filter = wanted[eventid]
+            if event_filter is None:
+                event = self.instance(typeid)
+            else:
+                event = self._filtered_struct(typeid, *event_filter)
+                if event is None:
+                    continue
+            event["_event"] = typename
+            event["_eventid"] = eventid
+            event["_gameloop"] = gameloop
+            event["_bits"] = (self._used - start) * 8
+            yield event
+
+    def instance(self, typeid):
+        if typeid >= len(self._typeinfos):
+            raise CorruptedError(self)
+        typeinfo = self._typeinfos[typeid]
+        return getattr(self, typeinfo[0])(*typeinfo[1])
+
+    def _read_byte(self):
+        b = self._data[self._used]
+        self._used += 1
+        return b
+
+    def _read_bytes(self, length):
+        end = self._used + length
+        if end > len(self._data):
+            raise TruncatedError(self)
+        result = bytes(self._data[self._used : end])
+        self._used = end
+        return result
+
+    def _expect_skip(self, expected):
+        if self._read_byte() != expected:
+            raise CorruptedError(self)
+
+    def _vint(self):
+        data = self._data
+        used = self._used
+        b = data[used]
+        used += 1
+        negative = b & 1
+        result = (b >> 1) & 0x3F
+        bits = 6
+        while b & 0x80:
+            b = data[used]
+            used += 1
+            result |= (b & 0x7F) << bits
+            bits += 7
+        self._used = used
+        return -result if negative else result
+
+    def _array(self, bounds, typeid):
+        self._expect_skip(0)
+        length = self._vint()
+        return [self.instance(typeid) for _ in range(length)]
+
+    def _bitarray(self, bounds):
+        self._expect_skip(1)
+        length = self._vint()
+        return (length, self._read_bytes((length + 7) // 8))
+
+    def _blob(self, bounds):
+        self._expect_skip(2)
+        length = self._vint()
+        return self._read_bytes(length)
+
+    def _bool(self):
+        self._expect_skip(6)
+        return self._read_byte() != 0
+
+    def _choice(self, bounds, fields):
+        self._expect_skip(3)
+        tag = self._vint()
+        if tag not in fields:
+            self._skip_instance()
+            return {}
+        field = fields[tag]
+        return {field[0]: self.instance(field[1])}
+
+    def _fourcc(self):
+        self._expect_skip(7)
+        return self._read_bytes(4)
+
+    def _int(self, bounds):
+        self._expect_skip(9)
+        return self._vint()
+
+    def _null(self):
+        return None
+
+    def _optional(self, typeid):
+        self._expect_skip(4)
+        exists = self._read_byte() != 0
+        return self.instance(typeid) if exists else None
+
+    def _real32(self):
+        self._expect_skip(7)
+        return struct.unpack(">f", self._read_bytes(4))
+
+    def _real64(self):
+        self._expect_skip(8)
+        return struct.unpack(">d", self._read_bytes(8))
+
+    def _fields_by_tag(self, fields):
+        key = id(fields)
+        if key not in self._fields:
+            self._fields[key] = {field[2]: field for field in fields}
+        return self._fields[key]
+
+    def _struct(self, fields):
+        self._expect_skip(5)
+        result = {}
+        length = self._vint()
+        fields_by_tag = self._fields_by_tag(fields)
+        for _ in range(length):
+            field = fields_by_tag.get(self._vint())
+            if field:
+                if field[0] == "__parent":
+                    parent = self.instance(field[1])
+                    if isinstance(parent, dict):
+                        result.update(parent)
+                    elif len(fields) == 1:
+                        result = parent
+                    else:
+                        result[field[0]] = parent
+                else:
+                    result[field[0]] = self.instance(field[1])
+            else:
+                self._skip_instance()
+        return result
+
+    def _filtered_struct(self, typeid, filter_field, values):
+        # Like _struct, but returns None (and skips the remaining fields) as soon as
+        # filter_field is decoded with a value that isn't in values.
+        fields = self._typeinfos[typeid][1][0]
+        self._expect_skip(5)
+        result = {}
+        length = self._vint()
+        fields_by_tag = self._fields_by_tag(fields)
+        for i in range(length):
+            field = fields_by_tag.get(self._vint())
+            if not field:
+                self._skip_instance()
+                continue
+            result[field[0]] = self.instance(field[1])
+            if field[0] == filter_field and result[field[0]] not in values:
+                for _ in range(length - i - 1):
+                    self._vint()
+                    self._skip_instance()
+                return None
+        return result
+
+    def _skip_instance(self):
+        data = self._data
+        skip = data[self._used]
+        self._used += 1
+        if skip == 9:  # vint
+            used = self._used
+            while data[used] & 0x80:
+                used += 1
+            self._used = used + 1
+        elif skip == 5:  # struct
+            for _ in range(self._vint()):
+                self._vint()
+                self._skip_instance()
+        elif skip == 0:  # array
+            for _ in range(self._vint()):
+                self._skip_instance()
+        elif skip == 1:  # bitblob
+            length = self._vint()
+            self._used += (length + 7) // 8
+        elif skip == 2:  # blob
+            length = self._vint()
+            self._used += length
+        elif skip == 3:  # choice
+            self._vint()
+            self._skip_instance()
+        elif skip == 4:  # optional
+            if self._read_byte() != 0:
+                self._skip_instance()
+        elif skip == 6:  # u8
+            self._used += 1
+        elif skip == 7:  # u32
+            self._used += 4
+        elif skip == 8:  # u64
+            self._used += 8
+        else:
+            raise CorruptedError(self)
+        if self._used > len(data):
+            raise TruncatedError(self)
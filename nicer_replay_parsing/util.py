@@ -1,4 +1,6 @@
+import bisect
 from datetime import datetime
+import importlib
 import pkgutil
 import re
 
@@ -1467,32 +1469,46 @@ _LOCALIZED_BATTLEGROUND_DICT = {
 }
 
 
+_PROTOCOL_BUILDS: list[int] = []
+_PROTOCOLS = {}
+
+
 def import_heroprotocol(base_build):
     try:
-        protocol = __import__(
-            "heroprotocol.versions", fromlist=[f"protocol{base_build}"]
+        return _PROTOCOLS[base_build]
+    except KeyError:
+        pass
+
+    # unsupported base builds use the closest previous build
+    builds = get_protocol_builds()
+    i = bisect.bisect_right(builds, base_build)
+    try:
+        protocol = importlib.import_module(
+            f"heroprotocol.versions.protocol{builds[max(i - 1, 0)]}"
         )
-        protocol = getattr(protocol, f"protocol{base_build}")
-    except (ImportError, AttributeError):
+    except (ImportError, IndexError):
+        protocol = None
+
+    _PROTOCOLS[base_build] = protocol
+    return protocol
 
-        # unsupported base build, use previous build
-        all_versions = [
-            module_name
-            for _, module_name, _ in pkgutil.iter_modules(
-                heroprotocol.versions.__path__
-            )
-        ]
-        fallback_build = int(all_versions[-1][-5:])
 
-        try:
-            protocol = __import__(
-                "heroprotocol.versions", fromlist=[f"protocol{fallback_build}"]
+def get_protocol_builds():
+    if not _PROTOCOL_BUILDS:
+        _PROTOCOL_BUILDS.extend(
+            sorted(
+                int(module_name[len("protocol") :])
+                for _, module_name, _ in pkgutil.iter_modules(
+                    heroprotocol.versions.__path__
+                )
+                if module_name.startswith("protocol")
             )
-            protocol = getattr(protocol, f"protocol{fallback_build}")
-        except (ImportError, AttributeError):
-            return None
+        )
+    return _PROTOCOL_BUILDS
 
-    return protocol
+
+def get_latest_build():
+    return get_protocol_builds()[-1]
 
 
 def get_gamemode(gamemode_id: int):
@@ -1554,3 +1570,37 @@ def get_battletag(lobby_data, player_name):
         tag = s.groups(0)[0].decode("utf-8")
         player_name = player_name.decode("utf-8")
         return f"{player_name}#{tag}"
+
+
+_BATTLETAG_NUMBER = re.compile(b"#(\\d{4,8})")
+
+
+def get_battletags(lobby_data, player_names):
+    """
+    Finds the battletags of all players in one pass over the battlelobby and returns
+    them as {player_name: battletag}. Players whose tag isn't found are left out.
+
+    A tag belongs to the longest player name in front of it, so "Bob" doesn't take
+    the tag of "BigBob". A name that is only ever found at the end of a longer one
+    gets the first tag after it, like get_battletag.
+    """
+    own = {}
+    suffixes = {}
+    names = set(player_names)
+    lengths = sorted({len(name) for name in names}, reverse=True)
+    for match in _BATTLETAG_NUMBER.finditer(lobby_data):
+        start = match.start()
+        longest = True
+        for length in lengths:
+            if length > start:
+                continue
+            name = bytes(lobby_data[start - length : start])
+            if name in names:
+                found = own if longest else suffixes
+                if name not in found:
+                    tag = bytes(match.group(1)).decode("utf-8")
+                    found[name] = f"{name.decode('utf-8')}#{tag}"
+                longest = False
+        if len(own) == len(names):
+            break
+    return {name: own.get(name) or suffixes[name] for name in own.keys() | suffixes}
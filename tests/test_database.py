@@ -0,0 +1,116 @@
+import sqlite3
+
+from benchmarks.synthetic import generate_replay
+from nicer_replay_parsing import ReplayDatabase, ReplayFilter, parse_replay
+from nicer_replay_parsing.model import Player
+
+# The players table of databases written before PRAGMA user_version was set, which
+# stored display names as the bytes parsed from the replay
+_OLD_PLAYERS = """
+    CREATE TABLE players (
+        replay_id TEXT NOT NULL,
+        team TEXT NOT NULL,
+        slot INTEGER NOT NULL,
+        toon_handle TEXT NOT NULL,
+        display_name TEXT NOT NULL,
+        battletag TEXT NOT NULL,
+        PRIMARY KEY (replay_id, team, slot)
+    )
+"""
+
+
+def parsed_replays():
+    replays = []
+    for seed in range(3):
+        data = generate_replay(2000, seed)
+        for i, mode in enumerate(("full", "fast")):
+            replay = parse_replay(data, mode=mode)
+            # Modes are stored as different replays
+            replay.id = f"{seed}{i}".ljust(32, "0")
+            replays.append(replay)
+    return replays
+
+
+def test_round_trip(tmp_path):
+    replays = parsed_replays()
+    replays[0].duration = 1234.5
+    team = replays[0].players[0]
+    replays[0].players = (
+        (Player(team[0].id, team[0].display_name, None), *team[1:]),
+        replays[0].players[1],
+    )
+    database = ReplayDatabase(tmp_path / "replays.db", batch_size=4)
+    try:
+        assert database.add_all(replays) == len(replays)
+        assert len(database) == len(replays)
+        for replay in replays:
+            assert replay.id in database
+            # Display names are read back as str, which to_dict() decodes to as well
+            assert database.get(replay.id).to_dict() == replay.to_dict()
+        assert database.get("f" * 32) is None
+
+        expected = sorted(replays, key=lambda replay: (replay.date, replay.id))
+        assert [r.to_dict() for r in database.query()] == [
+            r.to_dict() for r in expected
+        ]
+        replay_filter = ReplayFilter(
+            battlegrounds=[replays[0].battleground],
+            toon_handles=[replays[2].players[1][0].id],
+        )
+        matching = {r.id for r in replays if replay_filter.matches(r)}
+        assert matching and database.replay_ids(replay_filter) == matching
+        assert database.count(replay_filter) == len(matching)
+    finally:
+        database.close()
+
+
+def test_same_replay_twice_in_a_batch(tmp_path):
+    replay = parse_replay(generate_replay(1000, 0))
+    other = parse_replay(generate_replay(1000, 1))
+    database = ReplayDatabase(tmp_path / "replays.db")
+    try:
+        database.add_all([replay, other, replay])
+        assert len(database) == 2
+        assert database.get(replay.id) is not None
+        assert database.get(other.id) is not None
+    finally:
+        database.close()
+
+
+def test_migration(tmp_path):
+    path = tmp_path / "replays.db"
+    replays = parsed_replays()
+    database = ReplayDatabase(path)
+    database.add_all(replays)
+    database.close()
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute("ALTER TABLE players RENAME TO players_new")
+        connection.execute(_OLD_PLAYERS)
+        connection.execute(
+            "INSERT INTO players SELECT replay_id, team, slot, toon_handle,"
+            " CAST(display_name AS BLOB), battletag FROM players_new"
+        )
+        connection.execute("DROP TABLE players_new")
+        connection.execute("PRAGMA user_version = 0")
+    connection.close()
+
+    database = ReplayDatabase(path)
+    try:
+        version = database._connection.execute("PRAGMA user_version").fetchone()
+        assert version == (1,)
+        for replay in replays:
+            copy = database.get(replay.id)
+            assert isinstance(copy.players[0][0].display_name, str)
+            assert copy.to_dict() == replay.to_dict()
+        # Battletags can be NULL now
+        replay = replays[0]
+        player = replay.players[0][0]
+        replay.players = (
+            (Player(player.id, player.display_name, None), *replay.players[0][1:]),
+            replay.players[1],
+        )
+        database.add(replay)
+        assert database.get(replay.id).players[0][0].battletag is None
+    finally:
+        database.close()
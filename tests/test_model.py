@@ -0,0 +1,73 @@
+import pickle
+from datetime import datetime
+
+from nicer_replay_parsing.model import (
+    Battleground,
+    DraftAction,
+    DraftActionType,
+    Gamemode,
+    Hero,
+    Player,
+    Replay,
+    Team,
+    Version,
+)
+
+# A Replay pickled (protocol 4) by the dict-based models of version 0.8
+LEGACY_PICKLE = (
+    b"\x80\x04\x95:\x03\x00\x00\x00\x00\x00\x00\x8c\x1anicer_replay_parsing.mod"
+    b"el\x94\x8c\x06Replay\x94\x93\x94)\x81\x94}\x94(\x8c\x02id\x94\x8c 0123456"
+    b"789abcdef0123456789abcdef\x94\x8c\x07version\x94h\x00\x8c\x07Version\x94"
+    b"\x93\x94)\x81\x94}\x94(\x8c\nbase_build\x94J\x90_\x01\x00\x8c\x05major"
+    b"\x94K\x02\x8c\x05minor\x94K7\x8c\x08revision\x94K\x03\x8c\x05build\x94J"
+    b"\x91_\x01\x00\x8c\x05flags\x94K\x01ub\x8c\x08gamemode\x94h\x00\x8c\x08Gam"
+    b"emode\x94\x93\x94\x8c\x0cStorm League\x94\x85\x94R\x94\x8c\x08duration"
+    b"\x94M\xd2\x04\x8c\x04date\x94\x8c\x08datetime\x94\x8c\x08datetime\x94\x93"
+    b"\x94C\n\x07\xe7\x01\x02\x03\x04\x05\x00\x00\x00\x94\x85\x94R\x94\x8c\x07p"
+    b"layers\x94h\x00\x8c\x06Player\x94\x93\x94)\x81\x94}\x94(h\x05\x8c\n1-Hero"
+    b"-1-1\x94\x8c\x0cdisplay_name\x94\x8c\x05Alice\x94\x8c\tbattletag\x94\x8c"
+    b'\x07Alice#1\x94ub\x85\x94h")\x81\x94}\x94(h\x05\x8c\n1-Hero-1-2\x94h&\x8c'
+    b"\x03Bob\x94h(\x8c\x05Bob#2\x94ub\x85\x94\x86\x94\x8c\x06heroes\x94h\x00"
+    b"\x8c\x04Hero\x94\x93\x94K\x01\x8c\x07Abathur\x94h\x00\x8c\x04Role\x94\x93"
+    b"\x94\x8c\x07Support\x94\x85\x94R\x94\x87\x94\x85\x94R\x94\x85\x94h4K\x04"
+    b"\x8c\x03Ana\x94h7\x8c\x06Healer\x94\x85\x94R\x94\x87\x94\x85\x94R\x94\x85"
+    b"\x94\x86\x94\x8c\x0cbattleground\x94h\x00\x8c\x0cBattleground\x94\x93\x94"
+    b"\x8c\rCursed Hollow\x94K\x03\x86\x94\x85\x94R\x94\x8c\nincomplete\x94\x89"
+    b"\x8c\x06winner\x94h\x00\x8c\x04Team\x94\x93\x94\x8c\x04Left\x94\x85\x94R"
+    b"\x94\x8c\x05draft\x94]\x94(h\x00\x8c\x0bDraftAction\x94\x93\x94)\x81\x94}"
+    b"\x94(\x8c\x04type\x94h\x00\x8c\x0fDraftActionType\x94\x93\x94\x8c\x03Ban"
+    b"\x94\x85\x94R\x94\x8c\x04team\x94hU\x8c\x04hero\x94h4K\x0f\x8c\x03Cho\x94"
+    b"h7\x8c\x04Tank\x94\x85\x94R\x94\x87\x94\x85\x94R\x94ubhY)\x81\x94}\x94(h"
+    b"\\h^\x8c\x04Pick\x94\x85\x94R\x94hbhR\x8c\x05Right\x94\x85\x94R\x94hchEub"
+    b"e\x8c\tfirstpick\x94hrub."
+)
+
+
+def test_legacy_pickle():
+    replay = pickle.loads(LEGACY_PICKLE)
+    assert (
+        replay.to_dict()
+        == Replay(
+            "0123456789abcdef0123456789abcdef",
+            Version(90000, 2, 55, 3, 90001, 1),
+            Gamemode.STORM_LEAGUE,
+            1234,
+            datetime(2023, 1, 2, 3, 4, 5),
+            (
+                (Player("1-Hero-1-1", "Alice", "Alice#1"),),
+                (Player("1-Hero-1-2", "Bob", "Bob#2"),),
+            ),
+            ((Hero.ABATHUR,), (Hero.ANA,)),
+            Battleground.CURSED_HOLLOW,
+            False,
+            Team.LEFT,
+            [
+                DraftAction(DraftActionType.BAN, Team.LEFT, Hero.CHO),
+                DraftAction(DraftActionType.PICK, Team.RIGHT, Hero.ANA),
+            ],
+            Team.RIGHT,
+        ).to_dict()
+    )
+    assert replay.version == Version(90000, 2, 55, 3, 90001, 1)
+    # And it pickles again like a current Replay
+    assert pickle.loads(pickle.dumps(replay)).to_dict() == replay.to_dict()
@@ -0,0 +1,31 @@
+import sys
+
+import pytest
+
+from benchmarks.synthetic import generate_replay
+from nicer_replay_parsing import Battleground, parse_replay, probe_replay
+from nicer_replay_parsing.parse_replay import _walk_replays
+
+
+def _unknown_battleground(title):
+    raise KeyError(title)
+
+
+def test_probe_unknown_battleground(monkeypatch):
+    module = sys.modules["nicer_replay_parsing.parse_replay"]
+    monkeypatch.setattr(
+        module, "get_battleground_from_localized", _unknown_battleground
+    )
+    data = generate_replay(1000, 0)
+    assert probe_replay(data).battleground is Battleground.OTHER
+    with pytest.raises(NotImplementedError):
+        parse_replay(data)
+
+
+def test_walk_symlink_cycle(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "1.StormReplay").write_bytes(b"")
+    (tmp_path / "a" / "loop").symlink_to(tmp_path)
+    (tmp_path / "b").symlink_to(tmp_path / "a")
+    paths = list(_walk_replays(str(tmp_path)))
+    assert len(paths) == 1 and paths[0].endswith("1.StormReplay")
@@ -0,0 +1,56 @@
+import hashlib
+
+import pytest
+
+from nicer_replay_parsing.replay_ids import _MAGIC, _UNSORTED_MAGIC, ReplayIdIndex
+
+
+def replay_ids(count, start=0):
+    return [hashlib.md5(str(i).encode()).hexdigest() for i in range(start, count)]
+
+
+def test_membership():
+    ids = replay_ids(10_000)
+    index = ReplayIdIndex(ids[:9000])
+    for replay_id in ids[9000:]:
+        index.add(replay_id)
+    index.add(ids[0])
+    assert len(index) == len(ids)
+    assert sorted(index) == sorted(ids)
+    assert all(replay_id in index for replay_id in ids)
+    assert bytes.fromhex(ids[5]) in index
+    assert replay_ids(10_100, 10_000)[0] not in index
+    assert "not an id" not in index
+    index.discard(ids[1])
+    index.discard(ids[-1])
+    assert ids[1] not in index and ids[-1] not in index
+    assert len(index) == len(ids) - 2
+
+
+def test_file_round_trip(tmp_path):
+    ids = replay_ids(5000)
+    index = ReplayIdIndex(ids[:4000])
+    index.update(ids[4000:4100])
+    index.save(tmp_path / "ids")
+    data = (tmp_path / "ids").read_bytes()
+    # The magic, then the sorted digests
+    assert data == _MAGIC + b"".join(sorted(bytes.fromhex(i) for i in ids[:4100]))
+    loaded = ReplayIdIndex.load(tmp_path / "ids")
+    assert sorted(loaded) == sorted(ids[:4100])
+    assert ids[4100] not in loaded
+
+
+def test_unsorted_file():
+    # Format 1 files hold the digests in insertion order
+    ids = replay_ids(100)
+    data = _UNSORTED_MAGIC + b"".join(bytes.fromhex(i) for i in ids)
+    index = ReplayIdIndex.from_bytes(data)
+    assert all(replay_id in index for replay_id in ids)
+    assert index.to_bytes() == _MAGIC + b"".join(sorted(bytes.fromhex(i) for i in ids))
+
+
+def test_invalid_file():
+    with pytest.raises(ValueError):
+        ReplayIdIndex.from_bytes(b"NOTANIDX" + bytes(16))
+    with pytest.raises(ValueError):
+        ReplayIdIndex.from_bytes(_MAGIC + bytes(15))
@@ -0,0 +1,105 @@
+import json
+from datetime import datetime
+
+from benchmarks.synthetic import generate_replay
+from nicer_replay_parsing import parse_replay
+from nicer_replay_parsing.model import (
+    Battleground,
+    CompactReplay,
+    DraftAction,
+    DraftActionType,
+    Gamemode,
+    Hero,
+    Player,
+    Replay,
+    Team,
+    Version,
+)
+
+# fixed_replay().to_bytes() in format 1
+GOLDEN = (
+    "010123456789abcdef0123456789abcdef905f0100020037000300915f010000"
+    "0000000900000000004a934046f339343ff105000b00000011010101010a0032"
+    "2d4865726f2d312d310580416c6963650700416c69636523310a00322d486572"
+    "6f2d312d320300426f62ffff0104000f0304"
+)
+
+
+def fields(replay):
+    return (
+        replay.id,
+        replay.version,
+        replay.gamemode,
+        replay.duration,
+        replay.date,
+        replay.players,
+        replay.heroes,
+        replay.battleground,
+        replay.incomplete,
+        replay.winner,
+        list(replay.draft) if replay.draft is not None else None,
+        replay.firstpick,
+    )
+
+
+def parsed_replays():
+    for seed in range(3):
+        data = generate_replay(2000, seed)
+        for mode in ("full", "draft", "fast"):
+            yield parse_replay(data, mode=mode)
+
+
+def fixed_replay():
+    return Replay(
+        "0123456789abcdef0123456789abcdef",
+        Version(90000, 2, 55, 3, 90001, None),
+        Gamemode.STORM_LEAGUE,
+        1234.5,
+        datetime(2023, 1, 2, 3, 4, 5, 6),
+        (
+            (Player("2-Hero-1-1", b"Alice", "Alice#1"),),
+            (Player("2-Hero-1-2", "Bob", None),),
+        ),
+        ((Hero.ABATHUR,), (Hero.ANA,)),
+        Battleground.CURSED_HOLLOW,
+        False,
+        Team.LEFT,
+        [
+            DraftAction(DraftActionType.BAN, Team.LEFT, Hero.CHO),
+            DraftAction(DraftActionType.PICK, Team.RIGHT, Hero.ANA),
+        ],
+        None,
+    )
+
+
+def test_bytes_round_trip():
+    for replay in parsed_replays():
+        assert fields(Replay.from_bytes(replay.to_bytes())) == fields(replay)
+
+
+def test_dict_round_trip():
+    for replay in parsed_replays():
+        data = json.loads(json.dumps(replay.to_dict()))
+        copy = Replay.from_dict(data)
+        assert copy.to_dict() == replay.to_dict()
+        # Everything but the players, whose display names come back as str
+        assert fields(copy)[:5] == fields(replay)[:5]
+        assert fields(copy)[6:] == fields(replay)[6:]
+
+
+def test_compact_round_trip():
+    for replay in parsed_replays():
+        compact = replay.to_compact()
+        assert isinstance(compact, CompactReplay)
+        assert fields(compact) == fields(replay)
+        assert fields(compact.to_replay()) == fields(replay)
+        assert compact.to_bytes() == replay.to_bytes()
+        assert compact.to_dict() == replay.to_dict()
+        assert compact == Replay.from_bytes(replay.to_bytes()).to_compact()
+
+
+def test_bytes_golden():
+    # Changing this breaks stored replays: bump _BYTES_FORMAT and keep reading this
+    data = fixed_replay().to_bytes()
+    assert data.hex() == GOLDEN
+    assert fields(Replay.from_bytes(bytes.fromhex(GOLDEN))) == fields(fixed_replay())
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+
+from benchmarks.synthetic import generate_replay
+from nicer_replay_parsing import ReplayStore, ReplayTable, parse_replay
+from nicer_replay_parsing.store import _MAGIC, RECORD
+
+
+def parsed_replays():
+    replays = []
+    for seed in range(3):
+        data = generate_replay(2000, seed)
+        for mode in ("full", "fast"):
+            replays.append(parse_replay(data, mode=mode))
+    return replays
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "replays.rec"
+    replays = parsed_replays()
+    store = ReplayStore(path, batch_size=4)
+    assert store.extend(replays) == len(replays)
+    store.close()
+
+    # A new store reads what the other one wrote; to_bytes() has every field
+    store = ReplayStore(path)
+    assert len(store) == len(replays)
+    for i, replay in enumerate(replays):
+        assert store[i].to_bytes() == replay.to_bytes()
+    assert [replay.to_bytes() for replay in store] == [
+        replay.to_bytes() for replay in replays
+    ]
+
+
+def test_layout(tmp_path):
+    path = tmp_path / "replays.rec"
+    replays = parsed_replays()
+    store = ReplayStore(path)
+    store.extend(replays)
+
+    assert RECORD.itemsize == 157
+    assert os.path.getsize(path) == len(_MAGIC) + len(replays) * RECORD.itemsize
+    records = store.records
+    assert [bytes(digest).hex() for digest in records["id"]] == [
+        replay.id for replay in replays
+    ]
+    # The players are packed back to back in the strings heap
+    ends = records["players_offset"] + records["players_size"]
+    assert records["players_offset"][0] == 0
+    assert (records["players_offset"][1:] == ends[:-1]).all()
+    assert os.path.getsize(f"{path}.strings") == ends[-1]
+    assert (records["draft_types"][1::2] == -1).all()
+
+
+def test_interrupted_append(tmp_path):
+    path = tmp_path / "replays.rec"
+    replays = parsed_replays()
+    store = ReplayStore(path)
+    store.extend(replays[:2])
+    with open(path, "ab") as f:
+        f.write(b"\x00" * (RECORD.itemsize // 2))
+    assert len(store) == 2
+    store.extend(replays[2:])
+    assert [replay.to_bytes() for replay in store] == [
+        replay.to_bytes() for replay in replays
+    ]
+
+
+def test_table(tmp_path):
+    replays = parsed_replays()
+    store = ReplayStore(tmp_path / "replays.rec")
+    store.extend(replays)
+    expected = ReplayTable.from_replays(replays)
+    for table, rows in (
+        (store.table(), slice(None)),
+        (store.table(slice(1, 4)), slice(1, 4)),
+    ):
+        for column in ReplayTable.COLUMNS:
+            assert np.array_equal(
+                getattr(table, column),
+                getattr(expected, column)[rows],
+                equal_nan=column == "durations",
+            ), column
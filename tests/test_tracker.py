@@ -0,0 +1,50 @@
+from collections import Counter
+
+from benchmarks.synthetic import generate_replay
+from nicer_replay_parsing.archive import open_archive
+from nicer_replay_parsing.parse_replay import (
+    _DRAFT_EVENT_FILTERS,
+    _TRACKER_EVENT_FILTERS,
+)
+from nicer_replay_parsing.tracker import decode_tracker_events
+from nicer_replay_parsing.util import get_latest_build, import_heroprotocol
+
+PROTOCOL = import_heroprotocol(get_latest_build())
+
+
+def _tracker_events(seed):
+    archive = open_archive(generate_replay(5000, seed))
+    try:
+        return bytes(archive.read_file("replay.tracker.events"))
+    finally:
+        archive.close()
+
+
+def _expected(contents, event_filters):
+    # heroprotocol's decoder, filtered afterwards
+    events = []
+    for event in PROTOCOL.decode_replay_tracker_events(contents):
+        if event["_event"] not in event_filters:
+            continue
+        event_filter = event_filters[event["_event"]]
+        if event_filter is None or event[event_filter[0]] in event_filter[1]:
+            events.append(event)
+    return events
+
+
+def test_unfiltered_matches_heroprotocol():
+    contents = _tracker_events(0)
+    every_event = {name: None for _, name in PROTOCOL.tracker_event_types.values()}
+    counts = {}
+    events = list(decode_tracker_events(PROTOCOL, contents, every_event, counts))
+    expected = list(PROTOCOL.decode_replay_tracker_events(contents))
+    assert events == expected
+    assert counts == Counter(event["_event"] for event in expected)
+
+
+def test_filtered_matches_heroprotocol():
+    for seed in range(3):
+        contents = _tracker_events(seed)
+        for event_filters in (_TRACKER_EVENT_FILTERS, _DRAFT_EVENT_FILTERS):
+            events = list(decode_tracker_events(PROTOCOL, contents, event_filters))
+            assert events == _expected(contents, event_filters)
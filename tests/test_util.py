@@ -0,0 +1,38 @@
+from nicer_replay_parsing.util import get_battletag, get_battletags
+
+
+def test_battletags():
+    lobby = b"\x00\x0cAlice#1234\x07\x0aCarol#99999\x00"
+    assert get_battletags(lobby, [b"Alice", b"Carol", b"Dave"]) == {
+        b"Alice": "Alice#1234",
+        b"Carol": "Carol#99999",
+    }
+
+
+def test_battletag_suffix_of_longer_name():
+    # Bob's own record comes after BigBob's, which ends with his name
+    lobby = b"\x00\x12BigBob#1234\x00\x0eBob#5678\x00"
+    assert get_battletags(lobby, [b"Bob", b"BigBob"]) == {
+        b"BigBob": "BigBob#1234",
+        b"Bob": "Bob#5678",
+    }
+    lobby = b"\x00\x0eBob#5678\x00\x12BigBob#1234\x00"
+    assert get_battletags(lobby, [b"BigBob", b"Bob"]) == {
+        b"BigBob": "BigBob#1234",
+        b"Bob": "Bob#5678",
+    }
+
+
+def test_battletag_only_in_longer_name():
+    # Without a record of its own, a name gets the tag that follows it, like the
+    # regex of get_battletag finds
+    lobby = b"\x00\x12BigBob#1234\x00"
+    assert get_battletags(lobby, [b"Bob", b"BigBob"]) == {
+        b"BigBob": "BigBob#1234",
+        b"Bob": get_battletag(lobby, b"Bob"),
+    }
+
+
+def test_battletags_memoryview():
+    lobby = b"\x00\x0cAlice#1234\x00"
+    assert get_battletags(memoryview(lobby), [b"Alice"]) == {b"Alice": "Alice#1234"}